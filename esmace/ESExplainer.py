@@ -1,15 +1,23 @@
+import os
+from dataclasses import field
+import pickle
+import time
 from typing import List
 
+import numpy as np
+from joblib.externals.loky import ProcessPoolExecutor
 from tqdm.auto import tqdm
 
-from esmace.candidate import Explanation, update_metrics
+from esmace.candidate import CandidatePool, Explanation, update_metrics_many
 from esmace.discretizer import Discretizer
 from esmace.expand_strategy import ExpandStrategy
+from esmace.explanation_cache import ExplanationCache, params_key
 from esmace.mab import mab_lub
-from esmace.metric import Metric, is_probably_higher, is_probably_lower
+from esmace.metric import Metric, is_probably_higher
 from esmace.neighborhood import Neighborhood
 from esmace.sampler import Sampler
-from esmace.structure import Structure
+from esmace.stats import SearchHooks, SearchStats
+from esmace.structure import Structure, VisitedStructures
 from esmace.utils import check_is_fitted, dataclass
 
 
@@ -19,81 +27,472 @@ class Restriction:
     minimum_value: float
 
 
+@dataclass(slots=True, frozen=True)
+class Budget:
+    """
+    Limits of a single search, None means unlimited. Once one is reached no more points are sampled, the search stops
+    after the current iteration and returns the best candidate found so far. Requests are cut to the points left, so
+    max_points is never exceeded, nor max_model_calls unless the sampler splits a request (chunk_size).
+    """
+    time_limit: float = None
+    max_model_calls: int = None
+    max_points: int = None
+
+
+@dataclass(slots=True, frozen=False)
+class SearchState:
+    """
+    State of a beam search between iterations: the candidates of the next iteration, the hall of fame and the visited
+    structures. When order_random_state is given, the offspring are shuffled before the selection.
+    """
+    candidates: List[Explanation]
+    hall_of_fame: List[Explanation]
+    visited: VisitedStructures
+    order_random_state: np.random.RandomState = None
+    emigrants: List[Explanation] = field(default_factory=list)
+
+
 class ESExplainer:
 
     def __init__(self, sampler: Sampler, discretizer: Discretizer, expand_strategy: ExpandStrategy,
-                 initial_sampling_size=100) -> None:
+                 initial_sampling_size=100, sampling_budget=10_000, mab_round_size=8, verbose=True,
+                 hooks: SearchHooks = None, explanation_cache: ExplanationCache = None) -> None:
+        """
+        Args:
+            explanation_cache: optional, shared by the searches of explain (and explain_many, one copy per worker) to
+                reuse the explanations of instances with the same factual structure and warm-start the others.
+        """
         self.sampler = sampler
         self.discretizer = discretizer
         self.initial_sampling_size = initial_sampling_size
+        self.sampling_budget = sampling_budget
+        self.mab_round_size = mab_round_size
         self.expand_strategy = expand_strategy
+        self.verbose = verbose
+        self.hooks = hooks
+        self.explanation_cache = explanation_cache
 
     def fit(self, X, y):
+        """
+        A discretizer fitted out of core (with partial_fit or fit_chunks) is kept, it is not refitted on X.
+        """
         self.sampler.dataset_fit(X)
-        self.discretizer.fit(X, y)
+        if getattr(self.discretizer, 'sketch_', None) is None:
+            self.discretizer.fit(X, y)
         self.X_ = X
 
+    def save(self, path: str) -> None:
+        """
+        Save the fitted explainer to the directory path. The arrays of the explainer, its sampler, discretizer and
+        expand strategy (e.g. bin_start_, X_cache_ and y_cache_) are stored as .npy files so that load can memory
+        map them, the rest is pickled. predict_fn, the state of the last search and the runtime-only state dropped by
+        __getstate__ are not saved.
+        """
+        check_is_fitted(self)
+        # Per-discretizer state (e.g. the points of CachingTabularSampler) is saved so that loading does not rebuild it
+        self.sampler.fit_discretizer(self.discretizer)
+        os.makedirs(path, exist_ok=True)
+
+        components = {'explainer': self, 'sampler': self.sampler, 'discretizer': self.discretizer,
+                      'expand_strategy': self.expand_strategy}
+        arrays = {}
+        for component_name, component in components.items():
+            for name, value in _pickled_state(component).items():
+                if isinstance(value, np.ndarray) and value.dtype != object and id(value) not in arrays:
+                    file_name = f'{component_name}.{name}.npy'
+                    np.save(os.path.join(path, file_name), value)
+                    arrays[id(value)] = file_name
+
+        with open(os.path.join(path, _PICKLE_FILE), 'wb') as f:
+            _ExplainerPickler(f, arrays, self.sampler.predict_fn).dump(self)
+
+    @classmethod
+    def load(cls, path: str, predict_fn, mmap_mode: str = 'r') -> 'ESExplainer':
+        """
+        Load an explainer saved with save. With the default mmap_mode the arrays are memory mapped read-only, so
+        the processes that load the same directory share them through the page cache.
+
+        Args:
+            predict_fn: model used by the sampler of the loaded explainer.
+            mmap_mode: passed to np.load, None loads the arrays in memory.
+        """
+        with open(os.path.join(path, _PICKLE_FILE), 'rb') as f:
+            return _ExplainerUnpickler(f, path, predict_fn, mmap_mode).load()
+
+    def __getstate__(self):
+        # The state of the last search is not part of the fitted explainer
+        state = self.__dict__.copy()
+        for attribute in _SEARCH_STATE:
+            state.pop(attribute, None)
+        return state
+
     def explain(self, x, utility: Metric, neighborhood: Neighborhood, restriction: Restriction, tolerance: float = 0.01,
-                n_iterations: int = 50, beam_size: int = 5):
+                n_iterations: int = 50, beam_size: int = 5, return_stats: bool = False, budget: Budget = None,
+                patience: int = None):
+        """
+        Args:
+            budget: optional limits on the time, model calls and points of the search.
+            patience: stop early when the hall of fame has not changed for this many iterations.
+
+        Returns:
+            the best explanation as a list, and its SearchStats when return_stats is True. The stats of the last
+            search are also kept in stats_, and its final hall of fame in hall_of_fame_. With an explanation_cache,
+            an instance whose factual structure was already explained with the same parameters gets the cached
+            explanation (without sampling_data) and stats_.stop_reason 'cache'.
+        """
+        self._start_search(x, utility, neighborhood, restriction, tolerance, budget)
+
+        cache = self.explanation_cache
+        seeds = ()
+        if cache is not None:
+            factual = self.discretizer.to_structure(x)
+            params = params_key(utility, neighborhood, restriction, tolerance, n_iterations, beam_size, patience)
+            best = cache.get(factual, params)
+            if best is not None:
+                self.stats_.stop_reason = 'cache'
+                self._finish_search()
+                return (best, self.stats_) if return_stats else best
+
+            seeds = cache.warm_start(factual, params)
+
+        best = self._generate_explanation(x, n_iterations, beam_size, patience, seeds)
+        self._finish_search()
+
+        # A search cut by the budget is not the explanation of the parameters
+        if cache is not None and self.stats_.stop_reason != 'budget':
+            cache.put(factual, params, best, self.hall_of_fame_)
+
+        if return_stats:
+            return best, self.stats_
+        return best
+
+    def explain_iter(self, x, utility: Metric, neighborhood: Neighborhood, restriction: Restriction,
+                     tolerance: float = 0.01, n_iterations: int = 50, beam_size: int = 5, budget: Budget = None,
+                     patience: int = None):
+        """
+        Anytime version of explain: yields the best explanation so far (as a list) after each iteration, and last the
+        same result as explain. The caller may stop iterating at any point, stats_ then covers the search up to it.
+        """
+        self._start_search(x, utility, neighborhood, restriction, tolerance, budget)
+        try:
+            yield from self._search(x, n_iterations, beam_size, patience)
+        finally:
+            self._finish_search()
+
+    def _start_search(self, x, utility, neighborhood, restriction, tolerance, budget):
         check_is_fitted(self)
         self.discretizer.fit_target_sample(x)
         self.sampler.fit_discretizer(self.discretizer)
+        neighborhood.fit(self.X_, self.discretizer)
         self.expand_strategy.fit_discretizer(self.discretizer, neighborhood)
 
         self.tolerance_ = tolerance
         self.utility_ = utility
         self.neighborhood_ = neighborhood
         self.restriction_ = restriction
+        self.budget_ = budget
+
+        self.stats_ = SearchStats()
+        self._start_counters = self._sampler_counters()
+        self._start_time = time.perf_counter()
+
+    def _finish_search(self):
+        self.stats_.wall_time = time.perf_counter() - self._start_time
+        (self.stats_.model_calls, self.stats_.points_predicted, self.stats_.predict_time, self.stats_.cache_hits,
+         self.stats_.cache_misses) = self._search_counters()
+
+    def _search_counters(self):
+        return [end - begin for end, begin in zip(self._sampler_counters(), self._start_counters)]
+
+    def _budget_exhausted(self) -> bool:
+        budget = self.budget_
+        if budget is None:
+            return False
+
+        model_calls, points, *_ = self._search_counters()
+        return ((budget.time_limit is not None and time.perf_counter() - self._start_time >= budget.time_limit)
+                or (budget.max_model_calls is not None and model_calls >= budget.max_model_calls)
+                or (budget.max_points is not None and points >= budget.max_points))
+
+    def _points_left(self):
+        # Points the budget still allows, None when unlimited
+        if self._budget_exhausted():
+            return 0
+        if self.budget_ is None or self.budget_.max_points is None:
+            return None
+
+        _, points, *_ = self._search_counters()
+        return self.budget_.max_points - points
+
+    def _sampler_counters(self):
+        cache = getattr(self.sampler, 'prediction_cache', None)
+        cache_counters = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        return (self.sampler.n_model_calls, self.sampler.n_points_predicted, self.sampler.predict_time,
+                *cache_counters)
+
+    def explain_many(self, X, utility: Metric, neighborhood: Neighborhood, restriction: Restriction,
+                     tolerance: float = 0.01, n_iterations: int = 50, beam_size: int = 5, n_jobs: int = 1,
+                     seed: int = None, return_stats: bool = False, budget: Budget = None, patience: int = None):
+        """
+        Explain every row of X, spreading the instances over n_jobs worker processes.
+
+        The fitted explainer is shipped once to each worker. When seed is given, the sampler is reseeded before
+        each instance, so the explanations do not depend on n_jobs or on how instances are split among workers.
+
+        Returns:
+            list with the result of explain for each row of X, in order.
+        """
+        check_is_fitted(self)
+        # Per-discretizer state (e.g. the points of CachingTabularSampler or the index of DataSupportNeighborhood) is
+        # computed once and shipped to workers
+        self.sampler.fit_discretizer(self.discretizer)
+        neighborhood.fit(self.X_, self.discretizer)
+
+        if seed is None:
+            seeds = [None] * len(X)
+        else:
+            seeds = np.random.RandomState(seed).randint(np.iinfo(np.int32).max, size=len(X))
+
+        params = (utility, neighborhood, restriction, tolerance, n_iterations, beam_size, return_stats, budget,
+                  patience)
+
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+
+        if n_jobs == 1:
+            return [self._explain_seeded(x, x_seed, *params) for x, x_seed in zip(X, seeds)]
+
+        chunksize = max(1, len(X) // (4 * n_jobs))
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,)) as executor:
+            return list(executor.map(_explain_in_worker, X, seeds, [params] * len(X), chunksize=chunksize))
+
+    def explain_islands(self, x, utility: Metric, neighborhood: Neighborhood, restriction: Restriction,
+                        tolerance: float = 0.01, n_iterations: int = 50, beam_size: int = 5, n_islands: int = 4,
+                        migration_interval: int = 5, n_migrants: int = 1, seed: int = None):
+        """
+        Explain x with n_islands beam searches running in parallel processes. Each island samples with its own seeds
+        and, except the first one, expands its beam in a random order. Every migration_interval iterations the
+        islands merge their visited structures, so that none of them creates again a structure another island
+        created in a previous epoch (within an epoch, two islands may still create the same structure), and each
+        island sends the n_migrants best of its next candidates to the next island of the ring. Finally the best
+        explanation is selected among the halls of fame of all islands.
+
+        Returns:
+            the best explanation as a list, as explain. stats_ sums the work of all islands.
+        """
+        self._start_search(x, utility, neighborhood, restriction, tolerance, None)
+
+        if n_islands == -1:
+            n_islands = os.cpu_count()
+
+        random_state = np.random.RandomState(seed)
+        params = (utility, neighborhood, restriction, tolerance)
+        states = [None] * n_islands
+        islands_stats = []
+
+        with ProcessPoolExecutor(max_workers=n_islands, initializer=_init_worker, initargs=(self,)) as executor:
+            for start in range(0, n_iterations, migration_interval):
+                seeds = random_state.randint(np.iinfo(np.int32).max, size=n_islands)
+                epoch_iterations = min(migration_interval, n_iterations - start)
+                futures = [executor.submit(_island_epoch_in_worker, x, params, state, island, island_seed,
+                                           epoch_iterations, beam_size, n_migrants)
+                           for island, (state, island_seed) in enumerate(zip(states, seeds))]
+
+                states = []
+                for future in futures:
+                    state, island_stats = future.result()
+                    states.append(state)
+                    islands_stats.append(island_stats)
+
+                if all(len(state.candidates) == 0 for state in states):
+                    break
+
+                visited_keys = set().union(*(state.visited.keys for state in states))
+                for island, state in enumerate(states):
+                    state.visited.keys = visited_keys
+                    candidate_keys = {candidate.structure.key for candidate in state.candidates}
+                    state.candidates += [migrant for migrant in states[island - 1].emigrants
+                                         if migrant.structure.key not in candidate_keys]
+
+        hall_of_fame, keys = [], set()
+        for state in states:
+            for candidate in state.hall_of_fame:
+                if candidate.structure.key not in keys:
+                    keys.add(candidate.structure.key)
+                    hall_of_fame.append(candidate)
 
-        return self._generate_explanation(x, n_iterations, beam_size)
+        best = self._select_k_best(hall_of_fame, 1)
+        self._finish_search()
+
+        for island_stats in islands_stats:
+            self.stats_.add(island_stats)
+
+        return best
+
+    def _island_epoch(self, x, params, state: SearchState, island: int, seed: int, n_iterations: int, beam_size: int,
+                      n_migrants: int):
+        self.sampler.set_seed(seed)
+        self._start_search(x, *params, None)
+
+        if state is None:
+            state = self._initial_state(x, np.random.RandomState(seed) if island > 0 else None)
+
+        for iteration in range(n_iterations):
+            if len(state.candidates) == 0:
+                break
+            self._search_iteration(state, iteration, beam_size)
+
+        state.emigrants = self._select_k_best(state.candidates, n_migrants) if len(state.candidates) > 0 else []
+        self._finish_search()
+        return state, self.stats_
+
+    def _explain_seeded(self, x, seed, *params):
+        if seed is not None:
+            self.sampler.set_seed(seed)
+
+        return self.explain(x, *params)
 
     def _select_k_best(self, candidates, k):
-        valid, invalid = self._filter_candidates(candidates)
-        k_best = self._mab(valid, k)
+        if not self.utility_.is_estimation():
+            return self._select_k_best_deterministic(candidates, k)
+
+        with self.stats_.phase('validation'):
+            valid, invalid = self._filter_candidates(candidates)
 
-        if len(k_best) < k:
-            remaining_k = k - len(k_best)
-            surviving_invalid = self._mab(invalid, remaining_k, scorer='restriction')
-            k_best += surviving_invalid
+        with self.stats_.phase('bandit'):
+            k_best = self._mab(valid, k)
+
+            if len(k_best) < k:
+                remaining_k = k - len(k_best)
+                surviving_invalid = self._mab(invalid, remaining_k, scorer='restriction')
+                k_best += surviving_invalid
 
         return k_best
 
-    def _generate_explanation(self, x, n_iterations, beam_size):
+    def _select_k_best_deterministic(self, candidates, k):
+        """
+        Same selection as _select_k_best for a utility that needs no points: candidates are ranked by utility and only
+        those ranked above the k-th valid one are sampled and validated, in batches.
+        """
+        ranked = sorted(candidates, key=lambda x: x.utility_score.score, reverse=True)
+        valid, invalid = [], []
+
+        position = 0
+        while len(valid) < k and position < len(ranked):
+            batch = ranked[position:position + k - len(valid)]
+            position += len(batch)
+
+            with self.stats_.phase('candidates'):
+                self._evaluate(batch)
+
+            with self.stats_.phase('validation'):
+                batch_valid, batch_invalid = self._filter_candidates(batch)
+
+            valid += batch_valid
+            invalid += batch_invalid
+
+        if len(valid) < k:
+            # Every candidate has been evaluated
+            with self.stats_.phase('bandit'):
+                valid += self._mab(invalid, k - len(valid), scorer='restriction')
+
+        return valid
+
+    def _generate_explanation(self, x, n_iterations, beam_size, patience=None, seeds=()):
+        for best in self._search(x, n_iterations, beam_size, patience, seeds):
+            pass
+
+        return best
+
+    def _search(self, x, n_iterations, beam_size, patience=None, seeds=()):
+        state = self._initial_state(x, seeds=seeds)
+        n_unchanged = 0
+        self.stats_.stop_reason = 'n_iterations'
+
+        for iteration in tqdm(range(n_iterations), disable=not self.verbose):
+            previous_hall_of_fame = state.hall_of_fame
+            self._search_iteration(state, iteration, beam_size)
+
+            # Valid candidates come first in the hall of fame, its head is the best explanation so far
+            yield state.hall_of_fame[:1]
+
+            unchanged = ({c.structure.key for c in state.hall_of_fame} ==
+                         {c.structure.key for c in previous_hall_of_fame})
+            n_unchanged = n_unchanged + 1 if unchanged else 0
+
+            if len(state.candidates) == 0:
+                self.stats_.stop_reason = 'converged'
+                break
+            if self._budget_exhausted():
+                self.stats_.stop_reason = 'budget'
+                break
+            if patience is not None and n_unchanged >= patience:
+                self.stats_.stop_reason = 'patience'
+                break
+
+        # Keep best, without pulling more points once the budget is spent
+        best = self._select_k_best(state.hall_of_fame, 1)
+        self.hall_of_fame_ = state.hall_of_fame
+        yield best
+
+    def _initial_state(self, x, order_random_state: np.random.RandomState = None,
+                       seeds: np.ndarray = ()) -> 'SearchState':
+        """
+        Args:
+            seeds: optional (n_structures, n_features, 2) bins of structures containing x, e.g. from an
+                ExplanationCache, that start in the beam next to the factual structure.
+        """
         structure = self.discretizer.to_structure(x)
-        factual_candidate = self._create_candidate(structure)
+        visited = VisitedStructures(self.discretizer.encoder_, [structure])
+
+        structures = [structure]
+        if len(seeds) > 0:
+            for seed_bins in seeds[self.neighborhood_.check_inside_many(seeds)]:
+                seed = Structure(seed_bins)
+                if seed not in visited:
+                    visited.add(seed)
+                    structures.append(seed)
 
-        candidates = [factual_candidate]
-        previously_seen_structures = {factual_candidate.structure}
-        hall_of_fame = []
+        with self.stats_.phase('candidates'):
+            candidates = self._create_candidates(structures)
 
-        for _ in tqdm(range(n_iterations)):
-            surviving_candidates = self._select_k_best(candidates, beam_size)
+        return SearchState(candidates, [], visited, order_random_state)
 
-            only_old_candidates = True
-            new_candidates = []
+    def _search_iteration(self, state: 'SearchState', iteration: int, beam_size: int):
+        surviving_candidates = self._select_k_best(state.candidates, beam_size)
+
+        new_structures, parents = [], []
+        with self.stats_.phase('expansion'):
             for candidate in surviving_candidates:
-                new_offspring = set(self._expand_candidate(candidate, previously_seen_structures))
+                new_offspring = self._expand_candidate(candidate, state.visited)
+                new_structures.extend(new_offspring)
+                parents.extend([candidate] * len(new_offspring))
+                state.visited.update(new_offspring)
 
-                if len(new_offspring) > 0:
-                    only_old_candidates = False
-                    new_candidates.extend(new_offspring)
-                    previously_seen_structures |= {new_candidate.structure for new_candidate in new_offspring}
+        if state.order_random_state is not None:
+            # Offspring order breaks the ties of the selection
+            order = state.order_random_state.permutation(len(new_structures))
+            new_structures, parents = [new_structures[i] for i in order], [parents[i] for i in order]
 
-            # surviving_candidates: 
-            hall_of_fame = self._select_k_best(hall_of_fame + surviving_candidates, beam_size)
+        # All the offspring of the beam are scored with a single call to the model. A utility that needs no
+        # points is enough to rank them, then they are sampled only when they may be selected
+        with self.stats_.phase('candidates'):
+            new_candidates = self._create_candidates(new_structures, parents, lazy=not self.utility_.is_estimation())
 
-            candidates = new_candidates
-            if only_old_candidates:
-                break
+        # surviving_candidates: 
+        state.hall_of_fame = self._select_k_best(state.hall_of_fame + surviving_candidates, beam_size)
 
-        # Keep best
-        best = self._select_k_best(hall_of_fame, 1)
-        return best
+        if not self.utility_.is_estimation():
+            new_candidates = self._prune_dominated(new_candidates, state.hall_of_fame, beam_size)
+
+        self.stats_.n_iterations += 1
+        if self.hooks is not None:
+            self.hooks.on_iteration(iteration, surviving_candidates, state.hall_of_fame, self.stats_)
 
-    def _expand_candidate(self, candidate, previously_seen_structures):
-        structures = self.expand_strategy.expand(candidate.structure)
-        return [self._create_candidate(structure) for structure in structures if
-                structure not in previously_seen_structures]
+        state.candidates = new_candidates
+
+    def _expand_candidate(self, candidate, previously_seen_structures: VisitedStructures) -> List[Structure]:
+        return self.expand_strategy.expand(candidate.structure, previously_seen_structures, self.stats_)
 
     def _mab(self, candidates: List[Explanation], m: int, scorer: str = 'utility'):
         if scorer == 'utility':
@@ -104,43 +503,211 @@ class ESExplainer:
             scorer = lambda x: x.restriction_score
 
         if metric.is_estimation():
-            return mab_lub(candidates, m, self.tolerance_, scorer, self._update_metrics)
+            # The arms are the likely next pulls, the sampler may start sampling them while mab_lub sorts. Not with a
+            # budget, which would not account for the speculative predictions
+            if self.budget_ is None:
+                self.sampler.prefetch([candidate.structure for candidate in candidates])
+            return mab_lub(candidates, m, self.tolerance_, scorer, self._update_metrics_many,
+                           metric.reduce_uncertainty_to, round_size=self.mab_round_size)
         else:
             return sorted(candidates, key=lambda x: scorer(x).score, reverse=True)[:m]
 
     def _filter_candidates(self, candidates: List[Explanation]):
-        valid, invalid = [], []
+        """
+        Split the candidates by whether their restriction is probably above its minimum value. The undecided ones
+        are sampled, all of them in a single call per round, until their bounds settle them on one side.
+        """
+        restriction_metric = self.restriction_.metric
+        minimum_value = self.restriction_.minimum_value
+        pool = CandidatePool(candidates, lambda x: x.restriction_score)
 
-        for candidate in candidates:
-            if self._validate_candidate(candidate):
-                valid.append(candidate)
-            else:
-                invalid.append(candidate)
+        valid = np.zeros(len(pool), dtype=bool)
+        decided = np.zeros(len(pool), dtype=bool)
 
-        return valid, invalid
+        while True:
+            probably_higher = ~decided & (minimum_value - pool.lb < self.tolerance_)
+            probably_lower = ~decided & ~probably_higher & (minimum_value - pool.ub > self.tolerance_)
+            valid |= probably_higher
+            decided |= probably_higher | probably_lower
 
-    def _create_candidate(self, structure: Structure) -> Explanation:
-        X, y = self.sampler.initial_sampling(structure, n_points=self.initial_sampling_size)
-        utility_score = self.utility_.calculate(X, y, structure, None)
-        restriction_score = self.restriction_.metric.calculate(X, y, structure, None)
-        return Explanation(structure, utility_score, restriction_score, None)
+            pending = np.flatnonzero(~decided)
+            if len(pending) == 0:
+                break
 
-    def _validate_candidate(self, candidate: Explanation):
-        restriction_metric = self.restriction_.metric
-        mininum_value = self.restriction_.minimum_value
+            # Bound width that settles each candidate on its side of the threshold if the estimate holds
+            estimates = pool.estimate[pending]
+            widths = np.maximum(estimates - minimum_value + self.tolerance_,
+                                minimum_value - estimates - self.tolerance_)
+            pending_candidates = [pool.candidates[i] for i in pending]
+            n_points = [restriction_metric.reduce_uncertainty_to(candidate.restriction_score, width)
+                        for candidate, width in zip(pending_candidates, widths)]
+
+            spent = pending[np.array(self._update_metrics_many(pending_candidates, n_points)) == 0]
+            # Their bounds are already as narrow as needed, or their sampling budget is spent: trust the estimate
+            valid[spent] = pool.estimate[spent] >= minimum_value
+            decided[spent] = True
+            pool.refresh(pending)
+
+        self.stats_.candidates_invalid += int(np.sum(~valid))
+        return ([candidate for candidate, is_valid in zip(candidates, valid) if is_valid],
+                [candidate for candidate, is_valid in zip(candidates, valid) if not is_valid])
+
+    def _prune_dominated(self, candidates: List[Explanation], hall_of_fame: List[Explanation], beam_size: int):
+        # A full hall of fame of valid candidates only admits candidates with a higher utility
+        if len(hall_of_fame) < beam_size or not all(
+                is_probably_higher(x.restriction_score, self.restriction_.minimum_value, self.tolerance_)
+                for x in hall_of_fame):
+            return candidates
+
+        worst_utility = min(x.utility_score.score for x in hall_of_fame)
+        kept = [candidate for candidate in candidates if candidate.utility_score.score >= worst_utility]
+        self.stats_.candidates_pruned += len(candidates) - len(kept)
+        return kept
+
+    def _create_candidates(self, structures: List[Structure], parents: List[Explanation] = None,
+                           lazy: bool = False) -> List[Explanation]:
+        """
+        Args:
+            parents: explanation each structure was expanded from, whose points are reused.
+            lazy: only compute the utility, which must need no points, and leave the sampling to _evaluate.
+        """
+        if parents is None:
+            parents = [None] * len(structures)
+
+        candidates = [Explanation(structure, None, None, None, parent)
+                      for structure, parent in zip(structures, parents)]
+
+        if lazy:
+            X_empty, y_empty = np.empty((0, self.discretizer.n_features())), np.empty(0)
+            for candidate in candidates:
+                candidate.utility_score = self.utility_.calculate(X_empty, y_empty, candidate.structure, None)
+        else:
+            self._evaluate(candidates)
 
-        while True:
-            if is_probably_higher(candidate.restriction_score, mininum_value, self.tolerance_):
-                return True
-            elif is_probably_lower(candidate.restriction_score, mininum_value, self.tolerance_):
-                return False
-            else:
-                if candidate.restriction_score.score > mininum_value:
-                    width = candidate.restriction_score.score - mininum_value
-                else:
-                    width = mininum_value - candidate.restriction_score.score
-                n_points = restriction_metric.reduce_uncertainty_to(candidate.restriction_score, width)
-                self._update_metrics(candidate, n_points)
-
-    def _update_metrics(self, candidate: Explanation, n_points: int):
-        update_metrics(candidate, n_points, self.utility_, self.restriction_.metric, self.sampler)
+        self.stats_.candidates_created += len(candidates)
+        if self.hooks is not None:
+            for candidate in candidates:
+                self.hooks.on_candidate_created(candidate)
+
+        return candidates
+
+    def _evaluate(self, candidates: List[Explanation]):
+        """
+        Sample the lazy candidates, all of them with a single call to the sampler, and compute their scores.
+        """
+        pending = [candidate for candidate in candidates if not candidate.is_evaluated]
+        if len(pending) == 0:
+            return
+
+        n_points = self.initial_sampling_size
+        points_left = self._points_left()
+        if points_left is not None:
+            # The candidates share what is left of the budget, with no points they keep unbounded scores
+            share = points_left // len(pending)
+            n_points = share if n_points is None else min(n_points, share)
+
+        # Children reuse the points sampled in their parent
+        parents = [candidate.parent for candidate in pending]
+        samples = self.sampler.initial_sampling_many(
+            [candidate.structure for candidate in pending], n_points=n_points,
+            parents=[parent.structure if parent is not None else None for parent in parents],
+            parents_samples=[(parent.sampling_data['X'], parent.sampling_data['y']) if parent is not None else None
+                             for parent in parents])
+
+        for candidate, (X, y) in zip(pending, samples):
+            candidate.utility_score = self.utility_.calculate(X, y, candidate.structure, None)
+            candidate.restriction_score = self.restriction_.metric.calculate(X, y, candidate.structure, None)
+            candidate.sampling_data = {'X': X, 'y': y}
+            candidate.parent = None
+
+        self.stats_.candidates_evaluated += len(pending)
+
+    def _update_metrics_many(self, candidates: List[Explanation], n_points: List[int]) -> List[int]:
+        points_left = self._points_left()
+        if points_left == 0:
+            # Callers settle on the current estimates, as when the sampling budget of a candidate is spent
+            return [0] * len(candidates)
+
+        if self.sampling_budget is not None:
+            n_points = [max(min(n, self.sampling_budget - _n_points_used(candidate)), 0)
+                        for candidate, n in zip(candidates, n_points)]
+
+        if points_left is not None and sum(n_points) > points_left:
+            n_total = sum(n_points)
+            n_points = [n * points_left // n_total for n in n_points]
+
+        pulled = [(candidate, n) for candidate, n in zip(candidates, n_points) if n > 0]
+        if len(pulled) > 0:
+            pulled_candidates, pulled_n_points = [candidate for candidate, _ in pulled], [n for _, n in pulled]
+            update_metrics_many(pulled_candidates, pulled_n_points, self.utility_, self.restriction_.metric,
+                                self.sampler)
+
+            self.stats_.bandit_pulls += len(pulled)
+            self.stats_.points_pulled += sum(pulled_n_points)
+            if self.hooks is not None:
+                self.hooks.on_pull(pulled_candidates, pulled_n_points)
+
+        return n_points
+
+
+def _n_points_used(candidate: Explanation) -> int:
+    return max(candidate.utility_score.n_points_estimation, candidate.restriction_score.n_points_estimation)
+
+
+_PICKLE_FILE = 'explainer.pkl'
+
+_SEARCH_STATE = ('tolerance_', 'utility_', 'neighborhood_', 'restriction_', 'budget_', 'stats_', 'hall_of_fame_',
+                 '_start_counters', '_start_time')
+
+
+def _pickled_state(obj) -> dict:
+    # Without the runtime-only attributes that __getstate__ drops, e.g. the buffers of PrefetchingTabularSampler
+    state = obj.__getstate__() if hasattr(obj, '__getstate__') else None
+    return state if isinstance(state, dict) else vars(obj)
+
+
+class _ExplainerPickler(pickle.Pickler):
+    # Arrays already saved as .npy files and predict_fn are stored as references
+
+    def __init__(self, file, arrays, predict_fn):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = arrays
+        self.predict_fn = predict_fn
+
+    def persistent_id(self, obj):
+        if obj is self.predict_fn:
+            return 'predict_fn'
+        if isinstance(obj, np.ndarray):
+            return self.arrays.get(id(obj))
+        return None
+
+
+class _ExplainerUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, path, predict_fn, mmap_mode):
+        super().__init__(file)
+        self.path = path
+        self.predict_fn = predict_fn
+        self.mmap_mode = mmap_mode
+
+    def persistent_load(self, pid):
+        if pid == 'predict_fn':
+            return self.predict_fn
+        return np.load(os.path.join(self.path, pid), mmap_mode=self.mmap_mode)
+
+
+_worker_explainer = None
+
+
+def _init_worker(explainer: ESExplainer):
+    global _worker_explainer
+    _worker_explainer = explainer
+    _worker_explainer.verbose = False
+
+
+def _explain_in_worker(x, seed, params):
+    return _worker_explainer._explain_seeded(x, seed, *params)
+
+
+def _island_epoch_in_worker(x, params, state, island, seed, n_iterations, beam_size, n_migrants):
+    return _worker_explainer._island_epoch(x, params, state, island, seed, n_iterations, beam_size, n_migrants)
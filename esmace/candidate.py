@@ -1,3 +1,8 @@
+from dataclasses import field
+from typing import Callable, List, Sequence
+
+import numpy as np
+
 from esmace.utils import dataclass
 from esmace.metric import Score, Metric
 from esmace.sampler import Sampler
@@ -6,10 +11,19 @@ from esmace.structure import Structure
 
 @dataclass(slots=True, frozen=False)
 class Explanation:
+    """
+    A lazy explanation has no sampling_data yet, and only the scores that need no points. It keeps the explanation it
+    was expanded from in parent until it is sampled, so that it can reuse the points of the parent.
+    """
     structure: Structure
     utility_score: Score
     restriction_score: Score
     sampling_data: dict = None
+    parent: 'Explanation' = field(default=None, repr=False)
+
+    @property
+    def is_evaluated(self) -> bool:
+        return self.sampling_data is not None
 
     def __eq__(self, __o: object) -> bool:
         if isinstance(__o, Structure):
@@ -20,7 +34,46 @@ class Explanation:
         return hash(self.structure)
 
 
+class CandidatePool:
+    """
+    Struct of arrays view of one score of a list of candidates: the estimate, bounds and number of points of the
+    i-th candidate are estimate[i], lb[i], ub[i] and n_points[i]. Selections over the pool are vectorized, refresh
+    the candidates whose score changed.
+    """
+
+    def __init__(self, candidates: Sequence[Explanation], score: Callable[[Explanation], Score]) -> None:
+        self.candidates = list(candidates)
+        self.score = score
+
+        n_candidates = len(self.candidates)
+        self.estimate = np.empty(n_candidates)
+        self.lb = np.empty(n_candidates)
+        self.ub = np.empty(n_candidates)
+        self.n_points = np.empty(n_candidates, dtype=np.int64)
+        self.refresh(range(n_candidates))
+
+    def refresh(self, indices: Sequence[int]) -> None:
+        for i in indices:
+            score = self.score(self.candidates[i])
+            self.estimate[i], self.lb[i], self.ub[i] = score.score, score.lb, score.ub
+            self.n_points[i] = score.n_points_estimation
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+
 def update_metrics(candidate: Explanation, n_points: int, utility: Metric, restriction: Metric, sampler: Sampler):
-    X, y = sampler.sample(candidate.structure, n_points=n_points)
-    candidate.utility_score = utility.calculate(X, y, candidate.structure, candidate.utility_score)
-    candidate.restriction_score = restriction.calculate(X, y, candidate.structure, candidate.restriction_score)
+    update_metrics_many([candidate], [n_points], utility, restriction, sampler)
+
+
+def update_metrics_many(candidates: List[Explanation], n_points: List[int], utility: Metric, restriction: Metric,
+                        sampler: Sampler):
+    samples = sampler.sample_many([candidate.structure for candidate in candidates], n_points=n_points)
+
+    for candidate, (X, y) in zip(candidates, samples):
+        candidate.utility_score = utility.calculate(X, y, candidate.structure, candidate.utility_score)
+        candidate.restriction_score = restriction.calculate(X, y, candidate.structure, candidate.restriction_score)
+
+        if candidate.sampling_data is not None:
+            candidate.sampling_data = {'X': np.concatenate((candidate.sampling_data['X'], X)),
+                                       'y': np.concatenate((candidate.sampling_data['y'], y))}
@@ -1,6 +1,9 @@
+from typing import Dict, Iterable, List
+
 import numpy as np
 
-from esmace.structure import Structure
+from esmace.quantile_sketch import KLLSketch
+from esmace.structure import Structure, StructureEncoder
 from esmace.utils import check_is_fitted
 
 
@@ -15,6 +18,9 @@ class Discretizer:
     def to_structure(self, x: np.ndarray) -> Structure:
         pass
 
+    def to_structures(self, X: np.ndarray) -> List[Structure]:
+        return [self.to_structure(x) for x in X]
+
     def n_features(self) -> int:
         pass
 
@@ -24,30 +30,93 @@ class Discretizer:
 
 class TabularDiscretizer(Discretizer):
 
-    def __init__(self, num_bins: int = 10) -> None:
+    def __init__(self, num_bins: int = 10, sketch_size: int = 200, seed: int = None) -> None:
+        """
+        Args:
+            sketch_size: k of the KLLSketch of partial_fit and fit_chunks, the rank error of the bin starts is about
+                1.7 / sketch_size of the number of rows.
+            seed: of the sketch.
+        """
         super().__init__()
         self.num_bins = num_bins
+        self.sketch_size = sketch_size
+        self.seed = seed
 
     def fit(self, X: np.ndarray, y: np.ndarray) -> None:
-        bin_start = []
-        for feat in range(X.shape[1]):
-            feat_bins = [X[:, feat].min()]
+        # Exact bin starts, all the quantiles of a feature in one call. A column at a time, np.quantile copies its
+        # input. Discards the sketch of partial_fit
+        levels = self._quantile_levels()[1:-1]
+        quantiles = np.array([np.quantile(X[:, feat], q=levels) for feat in range(X.shape[1])])
+        self._set_bin_start(np.column_stack((X.min(axis=0), quantiles.reshape(X.shape[1], -1), X.max(axis=0))))
+        self.sketch_ = None
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray = None) -> 'TabularDiscretizer':
+        """
+        Add the chunk X to the sketch of the data seen so far and update the bin starts from it, so that data that
+        does not fit in memory is discretized in one pass.
+        """
+        if getattr(self, 'sketch_', None) is None:
+            self.sketch_ = KLLSketch(self.sketch_size, self.seed)
+
+        self.sketch_.update(X)
+        self._set_bin_start(self.sketch_.quantile(self._quantile_levels()).T)
+        return self
+
+    def fit_chunks(self, chunks: Iterable[np.ndarray]) -> 'TabularDiscretizer':
+        """
+        Fit on an iterable of (n_rows, n_features) chunks, e.g. slices of a memory mapped .npy file or the row
+        groups of a Parquet file, with one pass and the memory of the sketch and one chunk.
+        """
+        self.sketch_ = KLLSketch(self.sketch_size, self.seed)
+        for chunk in chunks:
+            self.sketch_.update(chunk)
+
+        self._set_bin_start(self.sketch_.quantile(self._quantile_levels()).T)
+        return self
+
+    def merge(self, other: 'TabularDiscretizer') -> 'TabularDiscretizer':
+        """
+        Merge the sketch of other, fitted with partial_fit or fit_chunks on another shard of the data, and update the
+        bin starts as if this discretizer had seen both shards.
+        """
+        check_is_fitted(self)
+        if self.sketch_ is None or getattr(other, 'sketch_', None) is None:
+            raise ValueError('Only discretizers fitted with partial_fit or fit_chunks can be merged')
 
-            for i in range(1, self.num_bins):
-                feat_bins.append(np.quantile(X[:, feat], q=(i + 1) / (self.num_bins + 1)))
+        self.sketch_.merge(other.sketch_)
+        self._set_bin_start(self.sketch_.quantile(self._quantile_levels()).T)
+        return self
 
-            feat_bins.append(X[:, feat].max())
-            bin_start.append(feat_bins)
+    def _quantile_levels(self) -> np.ndarray:
+        # Minimum, the num_bins - 1 inner bin starts and maximum
+        return np.concatenate(([0.], np.arange(2, self.num_bins + 1) / (self.num_bins + 1), [1.]))
 
-        self.bin_start_ = np.array(bin_start)
+    def _set_bin_start(self, bin_start: np.ndarray):
+        self.bin_start_ = bin_start
         self.n_features_ = len(self.bin_start_)
         self.num_bins_feature_ = np.array([self.num_bins] * self.n_features_)
+        self.encoder_ = StructureEncoder(self.num_bins_feature_)
 
     def to_obs_bins(self, x: np.ndarray) -> np.ndarray:
-        bins = np.array([np.digitize(x[i], self.bin_start_[i]) for i in range(len(x))]).astype(int) - 1
+        return self.to_obs_bins_many(np.asarray(x)[None])[0]
 
-        if not np.all(bins >= 0) and not np.all(bins <= self.num_bins):
-            raise ValueError(f'Observation {x} is outside the training ranges, could not convert to bins')
+    def to_obs_bins_many(self, X: np.ndarray) -> np.ndarray:
+        """
+        Bins of every row of X as a (n, n_features) array, computed for all rows and features at once. Same as
+        np.digitize on each feature, except that the maximum of a feature falls in its last bin.
+        """
+        check_is_fitted(self)
+        X = np.asarray(X)
+
+        outside = np.any((X < self.bin_start_[:, 0]) | (X > self.bin_start_[:, -1]), axis=1)
+        if np.any(outside):
+            raise ValueError(f'Observations {np.flatnonzero(outside)} are outside the training ranges, '
+                             f'could not convert to bins')
+
+        # Count the bin starts at or below each value, one pass over the data per bin start
+        bins = np.zeros(X.shape, dtype=int)
+        for start in range(1, self.bin_start_.shape[1] - 1):
+            bins += X >= self.bin_start_[:, start]
 
         return bins
 
@@ -62,6 +131,28 @@ class TabularDiscretizer(Discretizer):
         bins = np.column_stack((obs_bins, obs_bins)).astype(int)
         return Structure(bins)
 
+    def to_structures(self, X: np.ndarray) -> List[Structure]:
+        obs_bins = self.to_obs_bins_many(X)
+        return [Structure(bins) for bins in np.stack((obs_bins, obs_bins), axis=-1)]
+
+    def to_structure_keys(self, X: np.ndarray) -> List[bytes]:
+        """
+        Packed keys (see StructureEncoder) of the structures of every row of X, without building the structures.
+        """
+        obs_bins = self.to_obs_bins_many(X)
+        return self.encoder_.encode_many(np.stack((obs_bins, obs_bins), axis=-1))
+
+    def group_by_structure(self, X: np.ndarray) -> Dict[bytes, np.ndarray]:
+        """
+        Returns:
+            the indices of the rows of X that share each factual structure, by packed key.
+        """
+        groups = {}
+        for i, key in enumerate(self.to_structure_keys(X)):
+            groups.setdefault(key, []).append(i)
+
+        return {key: np.array(indices) for key, indices in groups.items()}
+
     def n_features(self) -> int:
         check_is_fitted(self)
         return self.n_features_
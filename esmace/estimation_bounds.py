@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.stats import beta, norm
 
 
 def hoeffding_bounds(sample_mean, n_points, p=0.025):
@@ -23,3 +24,245 @@ def hoeffding_bounds(sample_mean, n_points, p=0.025):
     estimated_mean = sample_mean
 
     return estimated_mean - bound, estimated_mean + bound
+
+
+def hoeffding_sample_size(sample_mean, width, p=0.025):
+    """ Number of points needed for the hoeffding bound to be narrower than width, that is, the smallest N such that
+    $\sqrt(\frac{-log(p)}{2N}) < width$. It does not depend on the sample mean.
+
+    Args:
+        sample_mean (float): current estimated mean.
+        width (float): target distance between the estimated mean and its bounds.
+        p (float, optional): probability for hoeffding bound. Defaults to 0.025.
+
+    Returns:
+        int: number of points
+    """
+    width = max(width, np.finfo(float).eps)
+    return int(np.floor(-np.log(p) / (2 * width ** 2))) + 1
+
+
+def empirical_bernstein_bounds(sample_mean, n_points, p=0.025):
+    """ Empirical Bernstein bounds (Maurer & Pontil, 2009) for the mean of a Bernoulli variable. The sample variance
+    $V = \hat{\mu}(1 - \hat{\mu}) \frac{N}{N - 1}$ makes them much tighter than hoeffding when the mean is close to
+    0 or 1: $l_b = \sqrt(\frac{2 V log(2 / p)}{N}) + \frac{7 log(2 / p)}{3 (N - 1)}$
+
+    Args:
+        sample_mean (float): estimated mean.
+        n_points (int): number of points of the estimation.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+
+    Returns:
+        (float, float): lower and upper bounds
+    """
+    if n_points < 2:
+        return -np.inf, np.inf
+
+    log_term = np.log(2 / p)
+    variance = sample_mean * (1 - sample_mean) * n_points / (n_points - 1)
+    bound = np.sqrt(2 * variance * log_term / n_points) + 7 * log_term / (3 * (n_points - 1))
+
+    return sample_mean - bound, sample_mean + bound
+
+
+def kl_bounds(sample_mean, n_points, p=0.025):
+    """ Chernoff bounds for the mean of a Bernoulli variable, based on the Kullback-Leibler divergence (KL-UCB):
+    the upper bound is the largest q such that $N kl(\hat{\mu}, q) \leq -log(p)$, and the lower bound the smallest.
+
+    See Kaufmann & Kalyanakrishnan (2013), Information complexity in bandit subset selection.
+
+    Args:
+        sample_mean (float): estimated mean.
+        n_points (int): number of points of the estimation.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+
+    Returns:
+        (float, float): lower and upper bounds
+    """
+    if n_points == 0:
+        return -np.inf, np.inf
+
+    level = -np.log(p) / n_points
+    lb = _kl_search(sample_mean, level, 0., sample_mean)
+    ub = _kl_search(sample_mean, level, 1., sample_mean)
+    return lb, ub
+
+
+def kl_sample_size(sample_mean, width, p=0.025):
+    """ Inverse of kl_bounds, in closed form: the upper bound is less than w = width away when
+    $N kl(\hat{\mu}, \hat{\mu} + w) > -log(p)$, so the smallest N is
+    $\lfloor \frac{-log(p)}{min(kl(\hat{\mu}, \hat{\mu} - w), kl(\hat{\mu}, \hat{\mu} + w))} \rfloor + 1$.
+    A side past 0 or 1 is always narrow enough and is left out.
+
+    Args:
+        sample_mean (float): current estimated mean.
+        width (float): target distance between the estimated mean and its bounds.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+
+    Returns:
+        int: number of points
+    """
+    width = max(width, np.finfo(float).eps)
+    divergences = [_kl_bernoulli(sample_mean, q) for q in (sample_mean - width, sample_mean + width) if 0 <= q <= 1]
+    if len(divergences) == 0:
+        return 1
+
+    return int(np.floor(-np.log(p) / min(divergences))) + 1
+
+
+def wilson_bounds(sample_mean, n_points, p=0.025):
+    """ Wilson score interval for the mean of a Bernoulli variable, with each bound exceeded with probability p
+    under the normal approximation.
+
+    Args:
+        sample_mean (float): estimated mean.
+        n_points (int): number of points of the estimation.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+
+    Returns:
+        (float, float): lower and upper bounds
+    """
+    if n_points == 0:
+        return -np.inf, np.inf
+
+    z2 = norm.ppf(1 - p) ** 2
+    denominator = 1 + z2 / n_points
+    center = (sample_mean + z2 / (2 * n_points)) / denominator
+    bound = np.sqrt(z2 * sample_mean * (1 - sample_mean) / n_points + z2 ** 2 / (4 * n_points ** 2)) / denominator
+
+    return center - bound, center + bound
+
+
+def variance_wilson_bounds(sample_mean, n_points, p=0.025, design_effect=1.):
+    """ Wilson score interval for a mean estimated with a variance reducing sampling design (stratified or quasi
+    Monte Carlo points). design_effect is the ratio between the variance of the estimate and the variance of an
+    i.i.d. estimate with the same number of points, the interval is the Wilson interval of the effective number of
+    points $N / design_effect$.
+
+    Args:
+        sample_mean (float): estimated mean.
+        n_points (int): number of points of the estimation.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+        design_effect (float, optional): defaults to 1, the i.i.d. Wilson interval.
+
+    Returns:
+        (float, float): lower and upper bounds
+    """
+    return wilson_bounds(sample_mean, n_points / design_effect, p)
+
+
+def variance_wilson_sample_size(sample_mean, width, p=0.025, design_effect=1.):
+    """ Inverse of variance_wilson_bounds: design_effect times the points the i.i.d. Wilson interval needs.
+    """
+    return int(np.ceil(design_effect * sample_size(wilson_bounds, sample_mean, width, p)))
+
+
+def clopper_pearson_bounds(sample_mean, n_points, p=0.025):
+    """ Exact (Clopper-Pearson) bounds for the mean of a Bernoulli variable, from the quantiles of the beta
+    distribution.
+
+    Args:
+        sample_mean (float): estimated mean.
+        n_points (int): number of points of the estimation.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+
+    Returns:
+        (float, float): lower and upper bounds
+    """
+    if n_points == 0:
+        return -np.inf, np.inf
+
+    hits = np.round(sample_mean * n_points)
+    lb = beta.ppf(p, hits, n_points - hits + 1) if hits > 0 else 0.
+    ub = beta.ppf(1 - p, hits + 1, n_points - hits) if hits < n_points else 1.
+    return lb, ub
+
+
+def sample_size(bounds, sample_mean, width, p=0.025, max_points=10 ** 9):
+    """ Smallest number of points for which both bounds are less than width away from sample_mean, assuming the
+    estimate does not change. Found by exponential and then binary search, so it works for any bound that shrinks
+    with the number of points.
+
+    Args:
+        bounds (Callable): bound function, such as hoeffding_bounds.
+        sample_mean (float): current estimated mean.
+        width (float): target distance between the estimated mean and its bounds.
+        p (float, optional): probability of each bound. Defaults to 0.025.
+        max_points (int, optional): returned when the width cannot be reached with fewer points.
+
+    Returns:
+        int: number of points
+    """
+
+    def narrow_enough(n_points):
+        lb, ub = bounds(sample_mean, n_points, p)
+        return max(sample_mean - lb, ub - sample_mean) < width
+
+    high = 2
+    while not narrow_enough(high):
+        if high >= max_points:
+            return max_points
+        high *= 2
+
+    low = high // 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if narrow_enough(middle):
+            high = middle
+        else:
+            low = middle
+
+    return high
+
+
+def _kl_bernoulli(p, q):
+    eps = 1e-15
+    p = np.clip(p, eps, 1 - eps)
+    q = np.clip(q, eps, 1 - eps)
+    return p * np.log(p / q) + (1 - p) * np.log((1 - p) / (1 - q))
+
+
+def _kl_search(sample_mean, level, limit, start, n_iterations=50):
+    # Bisection between the mean, where the divergence is 0, and the limit (0 or 1) for the q at the given level
+    inside, outside = start, limit
+    if _kl_bernoulli(sample_mean, limit) <= level:
+        return limit
+
+    for _ in range(n_iterations):
+        middle = (inside + outside) / 2
+        if _kl_bernoulli(sample_mean, middle) <= level:
+            inside = middle
+        else:
+            outside = middle
+
+    return inside
+
+
+BOUNDS = {
+    'hoeffding': hoeffding_bounds,
+    'empirical_bernstein': empirical_bernstein_bounds,
+    'kl': kl_bounds,
+    'wilson': wilson_bounds,
+    'clopper_pearson': clopper_pearson_bounds,
+    'variance_wilson': variance_wilson_bounds,
+}
+
+SAMPLE_SIZES = {
+    'hoeffding': hoeffding_sample_size,
+    'kl': kl_sample_size,
+    'variance_wilson': variance_wilson_sample_size,
+}
+
+# Bounds that also take the design_effect of the sampling, estimated by the metric
+VARIANCE_BOUNDS = {'variance_wilson'}
+
+
+def get_sample_size(name):
+    """ Inverse of the bound registered as name: a function (sample_mean, width, p) returning the number of points
+    needed for the bounds to be narrower than width.
+    """
+    if name in SAMPLE_SIZES:
+        return SAMPLE_SIZES[name]
+
+    bounds = BOUNDS[name]
+    return lambda sample_mean, width, p=0.025: sample_size(bounds, sample_mean, width, p)
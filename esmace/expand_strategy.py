@@ -2,13 +2,18 @@ import numpy as np
 
 from esmace.discretizer import Discretizer
 from esmace.neighborhood import Neighborhood
-from esmace.structure import Structure
+from esmace.stats import SearchStats
+from esmace.structure import Structure, VisitedStructures
 from esmace.utils import check_is_fitted
 
 
 class ExpandStrategy:
 
-    def expand(self, structure: Structure):
+    def expand(self, structure: Structure, previously_seen: VisitedStructures = None, stats: SearchStats = None):
+        """
+        Args:
+            stats: optional, counts the neighbors dropped because they were already seen or outside the neighborhood.
+        """
         raise NotImplemented()
 
     def fit_discretizer(self, discritizer: Discretizer, neighborhood: Neighborhood):
@@ -21,42 +26,41 @@ class StepExpandStrategy(ExpandStrategy):
         super().__init__()
         self.max_step = max_step
 
-    def _grow_tabular_structure(self, structure, feature, left, right):
-        previous_left, previous_right = structure.bins[feature]
-
-        left = left if left is not None else previous_left
-        right = right if right is not None else previous_right
-
-        if left > previous_left or right < previous_right:
-            raise NotImplementedError("Cannot make candidate smaller")
-
-        bins = np.copy(structure.bins)
-        bins[feature] = (left, right)
-        return Structure(bins)
-
-    def expand(self, structure: Structure):
+    def _neighbor_bins(self, structure: Structure) -> np.ndarray:
+        """
+        Build the bins of every left and right growth of the structure as a single
+        (n_neighbors, n_features, 2) array, ordered by feature and, within a feature, left growths first.
+        """
+        left, right = structure.bins[:, 0], structure.bins[:, 1]
+        steps = np.arange(1, self.max_step + 1)
+
+        # (n_features, 2 * max_step) new limits: left - max_step, ..., left - 1, right + 1, ..., right + max_step
+        new_limits = np.column_stack((left[:, None] - steps[::-1], right[:, None] + steps))
+        valid = np.column_stack((new_limits[:, :self.max_step] >= 0,
+                                 new_limits[:, self.max_step:] < self.discretizer_.num_bins_feature_[:, None]))
+        side = np.repeat([0, 1], self.max_step)
+
+        feature, column = np.nonzero(valid)
+        neighbors = np.repeat(structure.bins[None], len(feature), axis=0)
+        neighbors[np.arange(len(feature)), feature, side[column]] = new_limits[feature, column]
+        return neighbors
+
+    def expand(self, structure: Structure, previously_seen: VisitedStructures = None, stats: SearchStats = None):
         check_is_fitted(self)
-        candidates = []
-
-        for feature in range(self.discretizer_.n_features()):
-            left, right = structure.bins[feature]
-
-            # Left grow
-            for left_new in range(max(0, left - self.max_step), left):
-                new_candidate = self._grow_tabular_structure(structure, feature, left_new, right)
 
-                if self.neighborhood_.check_inside(new_candidate):
-                    candidates.append(new_candidate)
+        neighbors = self._neighbor_bins(structure)
+        n_neighbors = len(neighbors)
+        if previously_seen is not None:
+            neighbors = neighbors[~previously_seen.contains_many(neighbors)]
 
-            # Right grow
-            for right_new in range(right + 1,
-                                   min(right + self.max_step + 1, self.discretizer_.num_bins_feature_[feature])):
-                new_candidate = self._grow_tabular_structure(structure, feature, left, right_new)
+        n_unseen = len(neighbors)
+        neighbors = neighbors[self.neighborhood_.check_inside_many(neighbors)]
 
-                if self.neighborhood_.check_inside(new_candidate):
-                    candidates.append(new_candidate)
+        if stats is not None:
+            stats.candidates_deduplicated += n_neighbors - n_unseen
+            stats.candidates_pruned += n_unseen - len(neighbors)
 
-        return candidates
+        return [Structure(neighbor_bins) for neighbor_bins in neighbors]
 
     def fit_discretizer(self, discritizer: Discretizer, neighborhood: Neighborhood):
         self.discretizer_ = discritizer
@@ -0,0 +1,102 @@
+import pickle
+from collections import OrderedDict
+from dataclasses import replace
+from typing import List
+
+import numpy as np
+
+from esmace.candidate import Explanation
+from esmace.structure import Structure
+from esmace.utils import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class _CacheEntry:
+    factual: Structure
+    best: List[Explanation]
+    hall_of_fame_bins: np.ndarray
+
+
+class ExplanationCache:
+    """
+    LRU cache of explanations across instances, keyed by the factual structure of the instance and the parameters of
+    the search (see params_key). An instance whose factual cell is cached gets the cached explanation back without a
+    search. Otherwise, the hall of fame of the closest cached cell searched with the same parameters, at most
+    max_distance bins away (L1 distance, None for any), warm-starts the beam once widened to contain the new cell.
+
+    The cached explanations are kept without their sampling_data, so each entry takes a few structures.
+    """
+
+    def __init__(self, max_size: int = 1024, max_distance: int = None) -> None:
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.hits = 0
+        self.warm_starts = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, factual: Structure, params: bytes) -> List[Explanation]:
+        entry = self._entries.get((params, factual.key))
+        if entry is None:
+            return None
+
+        self._entries.move_to_end((params, factual.key))
+        self.hits += 1
+        return list(entry.best)
+
+    def warm_start(self, factual: Structure, params: bytes) -> np.ndarray:
+        """
+        Returns:
+            (n_structures, n_features, 2) bins of the hall of fame of the closest cached cell, each widened to
+            contain factual. Empty when no cell is close enough.
+        """
+        entries = [entry for (entry_params, _), entry in self._entries.items() if entry_params == params]
+        if len(entries) > 0:
+            cells = np.stack([entry.factual.bins[:, 0] for entry in entries])
+            distances = np.abs(cells - factual.bins[:, 0]).sum(axis=1)
+            closest = int(np.argmin(distances))
+
+            if self.max_distance is None or distances[closest] <= self.max_distance:
+                self._entries.move_to_end((params, entries[closest].factual.key))
+                self.warm_starts += 1
+
+                bins = entries[closest].hall_of_fame_bins.copy()
+                bins[:, :, 0] = np.minimum(bins[:, :, 0], factual.bins[:, 0])
+                bins[:, :, 1] = np.maximum(bins[:, :, 1], factual.bins[:, 1])
+                return bins
+
+        self.misses += 1
+        return np.empty((0, *factual.bins.shape), dtype=factual.bins.dtype)
+
+    def put(self, factual: Structure, params: bytes, best: List[Explanation],
+            hall_of_fame: List[Explanation]) -> None:
+        best = [replace(candidate, sampling_data=None, parent=None) for candidate in best]
+        hall_of_fame_bins = np.array([candidate.structure.bins for candidate in hall_of_fame]).reshape(
+            -1, *factual.bins.shape)
+
+        self._entries[(params, factual.key)] = _CacheEntry(factual, best, hall_of_fame_bins)
+        self._entries.move_to_end((params, factual.key))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def params_key(*params) -> bytes:
+    """
+    Key of the parameters of a search. Objects are compared by type and attributes, leaving out the fitted ones
+    (trailing underscore) such as the index of DataSupportNeighborhood.
+    """
+    return pickle.dumps([_unfitted(param) for param in params], protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _unfitted(value):
+    if not hasattr(value, '__dict__'):
+        return value
+
+    return type(value).__qualname__, {name: attribute for name, attribute in vars(value).items()
+                                      if not name.endswith('_')}
@@ -1,76 +1,156 @@
-from typing import Callable, List
+from typing import Callable, List, Sequence
 
-from esmace.candidate import Explanation
-from esmace.metric import Score, is_probably_better
+import numpy as np
+
+from esmace.candidate import CandidatePool, Explanation
+from esmace.metric import Score
 
 
 def mab_lub(candidates: List[Explanation], m: int, tolerance: float, score: Callable[[Explanation], Score],
-            update_metrics: Callable[[Explanation, int], None]):
+            update_metrics: Callable[[List[Explanation], List[int]], List[int]],
+            reduce_uncertainty: Callable[[Score, float], int], round_size: int = 2):
     """
-    TODO: Remaining is almost sorted (only two pos can change), optimize this to avoid full sort.
+    LUCB selection of the m best candidates. The scores of the arms are kept in a CandidatePool, so finding the
+    extreme arms and the arms blocking a decision are vectorized partial sorts, linear in the number of arms.
 
     Args:
         candidates:
         m:
         tolerance:
         score:
-        update_metrics:
+        update_metrics: samples new points for a batch of candidates at once, returns how many were drawn for each
+            (0 once the budget of a candidate is spent).
+        reduce_uncertainty: number of new points for a score to reach a given bound width.
+        round_size: maximum number of arms pulled in a round. Besides the pair that LUCB would pull, a round samples
+            the other arms that block the same decision, all of them with a single call to update_metrics. Selecting
+            best_by_lb is blocked by the arms whose ub is at least tolerance above its lb, and discarding worst_by_ub
+            by the arms whose lb is at least tolerance below its ub, that is, the arms that could still replace
+            compare_best and compare_worst.
 
     Returns:
-
+        the selected candidates, best first, followed by the rest of the arms when fewer than m could be told apart.
     """
-
+    pool = CandidatePool(candidates, score)
+    alive = np.ones(len(pool), dtype=bool)
     selected = list()
-    remaining = list(candidates)
 
     num_discarded = 0
-    num_arms = len(candidates)
+    num_arms = len(pool)
 
     while len(selected) < m and num_discarded < num_arms - m:
+        remaining = np.flatnonzero(alive)
 
         if len(remaining) == 1:
-            last = remaining.pop()
-            selected.append(last)
+            selected.append(remaining[0])
+            alive[remaining[0]] = False
             break
 
-        remaining.sort(key=lambda x: score(x).lb, reverse=True)
-        best_by_lb, second_best_by_lb = remaining[0], remaining[1]
-        worst_by_lb, second_worst_by_lb = remaining[-1], remaining[-2]
-
-        remaining.sort(key=lambda x: score(x).ub, reverse=True)
-        best_by_ub, second_best_by_ub = remaining[0], remaining[1]
-        worst_by_ub, second_worst_by_ub = remaining[-1], remaining[-2]
+        lb, ub = pool.lb[remaining], pool.ub[remaining]
+        best_by_lb, second_best_by_lb = remaining[_extremes(lb, 2, largest=True)]
+        worst_by_lb, second_worst_by_lb = remaining[_extremes(lb, 2, largest=False)]
+        best_by_ub, second_best_by_ub = remaining[_extremes(ub, 2, largest=True)]
+        worst_by_ub, second_worst_by_ub = remaining[_extremes(ub, 2, largest=False)]
 
         compare_best = best_by_ub if best_by_ub != best_by_lb else second_best_by_ub
         compare_worst = worst_by_lb if worst_by_lb != worst_by_ub else second_worst_by_lb
 
-        if is_probably_better(score(best_by_lb), score(compare_best), tolerance):
-            first = remaining.pop(0)
-            selected.append(first)
-        elif is_probably_better(score(worst_by_ub), score(compare_worst), tolerance):
+        if pool.ub[compare_best] - pool.lb[best_by_lb] < tolerance:
+            selected.append(best_by_lb)
+            alive[best_by_lb] = False
+        elif pool.ub[worst_by_ub] - pool.lb[compare_worst] < tolerance:
             num_discarded += 1
-            remaining.pop()
+            alive[worst_by_ub] = False
         else:
-            best_diff = score(best_by_lb).lb - score(compare_best).ub
-            worst_diff = score(compare_worst).lb - score(worst_by_ub).ub
+            best_diff = pool.lb[best_by_lb] - pool.ub[compare_best]
+            worst_diff = pool.lb[compare_worst] - pool.ub[worst_by_ub]
 
             if best_diff > worst_diff:
-                reduce_bounds_diff(best_by_lb, compare_best, update_metrics, tolerance)
+                # Arms that keep best_by_lb from being selected, from the highest ub
+                blocking = remaining[ub - pool.lb[best_by_lb] >= tolerance]
+                blocking = blocking[_extremes(pool.ub[blocking], round_size, largest=True)]
+                pair = (best_by_lb, compare_best)
             else:
-                reduce_bounds_diff(compare_worst, worst_by_ub, update_metrics, tolerance)
-
-    if len(selected) == m:
-        return selected
+                # Arms that keep worst_by_ub from being discarded, from the lowest lb
+                blocking = remaining[pool.ub[worst_by_ub] - lb >= tolerance]
+                blocking = blocking[_extremes(pool.lb[blocking], round_size, largest=False)]
+                pair = (worst_by_ub, compare_worst)
+
+            # Bounds of the pair as narrow as the comparison needs: if the estimates hold, it is resolved
+            pair_width = (tolerance + abs(pool.estimate[pair[0]] - pool.estimate[pair[1]])) / 2
+            settled = all(reduce_uncertainty(score(pool.candidates[arm]), pair_width) == 0 for arm in pair)
+
+            if not settled:
+                arms = _round_arms(pair, blocking, round_size)
+                n_points = reduce_bounds_diff(pool.candidates[arms[0]], [pool.candidates[arm] for arm in arms[1:]],
+                                              score, update_metrics, reduce_uncertainty, tolerance)
+                pool.refresh(arms)
+                # Nothing drawn for the pair once it spent its sampling budget
+                settled = n_points[0] + n_points[1] == 0
+
+            if settled:
+                # Keep the best estimate or discard the worst one
+                if best_diff > worst_diff:
+                    first = max(pair, key=lambda arm: pool.estimate[arm])
+                    selected.append(first)
+                    alive[first] = False
+                else:
+                    num_discarded += 1
+                    alive[min(pair[::-1], key=lambda arm: pool.estimate[arm])] = False
+
+    result = [pool.candidates[i] for i in selected]
+    if len(selected) < m:
+        remaining = np.flatnonzero(alive)
+        result += [pool.candidates[i] for i in remaining[_extremes(pool.ub[remaining], len(remaining), largest=True)]]
+
+    return result
+
+
+def _extremes(values: np.ndarray, k: int, largest: bool) -> np.ndarray:
+    # Positions of the k largest (or smallest) values in order, by partitioning instead of sorting all of them
+    keys = -values if largest else values
+    k = min(k, len(values))
+    if k == 0:
+        return np.empty(0, dtype=int)
+    if k < len(values):
+        positions = np.argpartition(keys, k - 1)[:k]
     else:
-        return selected + remaining
+        positions = np.arange(len(values))
+
+    return positions[np.lexsort((positions, keys[positions]))]
+
+
+def _round_arms(pair, blocking: Sequence[int], round_size: int) -> List[int]:
+    arms = [int(arm) for arm in pair]
+    for arm in blocking:
+        if len(arms) >= round_size:
+            break
+        if arm not in arms:
+            arms.append(int(arm))
+
+    return arms
+
+
+def reduce_bounds_diff(reference: Explanation, others: List[Explanation], score: Callable[[Explanation], Score],
+                       update_metrics: Callable[[List[Explanation], List[int]], List[int]],
+                       reduce_uncertainty: Callable[[Score, float], int], max_diff: float) -> List[int]:
+    """
+    Sample the reference arm and the arms it is compared to until, if their estimates hold, every comparison is
+    resolved: the bound widths of each pair have to add up to less than max_diff plus the difference of their
+    estimates. The arms that need new points are sampled with a single call to update_metrics.
+
+    Returns:
+        number of points drawn for the reference and for each of the others.
+    """
+    widths = [(max_diff + abs(score(reference).score - score(other).score)) / 2 for other in others]
 
+    arms = [reference] + list(others)
+    n_points = [reduce_uncertainty(score(reference), min(widths))]
+    n_points += [reduce_uncertainty(score(other), width) for other, width in zip(others, widths)]
 
-def reduce_bounds_diff(best: Explanation, second_best: Explanation, update_metrics: Callable[[Explanation, int], None],
-                       max_diff: float):
-    diff = max_diff - (best.utility_score.lb - second_best.utility_score.ub)
-    diff_split = diff / 2
+    pulled = [i for i, n in enumerate(n_points) if n > 0]
+    drawn = [0] * len(arms)
+    if len(pulled) > 0:
+        for i, n in zip(pulled, update_metrics([arms[i] for i in pulled], [n_points[i] for i in pulled])):
+            drawn[i] = n
 
-    n_points_best = 100  # utility.reduce_uncertainty_to(best, diff_split)
-    n_points_second_best = 100  # utility.reduce_uncertainty_to(second_best, diff_split)
-    update_metrics(best, n_points_best)
-    update_metrics(second_best, n_points_second_best)
+    return drawn
@@ -1,6 +1,7 @@
 import numpy as np
+from scipy.stats import chi2
 
-from esmace.estimation_bounds import hoeffding_bounds
+from esmace.estimation_bounds import BOUNDS, VARIANCE_BOUNDS, get_sample_size
 from esmace.grouping_measure import GroupingMeasure
 from esmace.structure import Structure
 from esmace.utils import dataclass
@@ -16,6 +17,10 @@ class Score:
 
     n_points_estimation: int
 
+    # Number of batches (calls to calculate) of the estimation and sum of their size times their squared mean
+    n_batches: int = 0
+    batch_sum_squares: float = 0.
+
     @property
     def score(self):
         return self.fixed_component + self.uncertain_component
@@ -38,7 +43,11 @@ class Metric:
         """
         raise NotImplemented("Method calculate should be implemented")
 
-    def reduce_uncertainty_to(self, estimation: Score, width: float):
+    def reduce_uncertainty_to(self, estimation: Score, width: float) -> int:
+        """
+        Number of new points needed for the bounds of the estimation to be at most width away from the estimate, 0 when
+        they already are.
+        """
         return 100
 
     def is_estimation(self):
@@ -47,34 +56,83 @@ class Metric:
 
 class FidelityMetric(Metric):
 
-    def __init__(self, grouping_measure: GroupingMeasure, p: float = 0.05) -> None:
+    def __init__(self, grouping_measure: GroupingMeasure, p: float = 0.05, bounds: str = 'hoeffding',
+                 min_batches: int = 5, max_variance_reduction: float = 10.) -> None:
+        """
+        Args:
+            bounds: name of the confidence bounds in estimation_bounds.BOUNDS.
+            min_batches: for the bounds in VARIANCE_BOUNDS, batches needed before the variance of the sampling is
+                estimated from the spread of the batch means, until then the estimate is assumed i.i.d.
+            max_variance_reduction: for the bounds in VARIANCE_BOUNDS, largest variance reduction trusted over
+                i.i.d. sampling, it guards against batch means that agree by chance.
+        """
         super().__init__()
+        if bounds not in BOUNDS:
+            raise ValueError(f'Unknown bounds {bounds}, available bounds are {list(BOUNDS)}')
+
         self.grouping_measure = grouping_measure
         self.p = p
+        self.bounds = bounds
+        self.min_batches = min_batches
+        self.max_variance_reduction = max_variance_reduction
 
     def calculate(self, X, y, structure: Structure, previous_estimation: Score = None) -> Score:
         new_label = self.grouping_measure.calculate(y)
         hits = new_label == 1
 
         count = len(new_label)
-        avg = np.mean(hits)
 
         if previous_estimation is None:
-            previous_avg = 0
-            previous_count = 0
-        else:
-            previous_avg = previous_estimation.uncertain_component
-            previous_count = previous_estimation.n_points_estimation
+            previous_estimation = Score(0, 0., -np.inf, np.inf, 0)
+
+        previous_avg = previous_estimation.uncertain_component
+        previous_count = previous_estimation.n_points_estimation
 
         new_count = count + previous_count
-        new_estimation = (avg * count + previous_avg * previous_count) / new_count
+        if new_count == 0:
+            # No points fell inside the structure (e.g. an empty cell of the sampler cache)
+            return Score(0, 0., -np.inf, np.inf, 0)
+
+        new_estimation = (np.sum(hits) + previous_avg * previous_count) / new_count
 
-        lb, ub = hoeffding_bounds(new_estimation, new_count, self.p)
+        n_batches = previous_estimation.n_batches
+        batch_sum_squares = previous_estimation.batch_sum_squares
+        if count > 0:
+            n_batches += 1
+            batch_sum_squares += np.sum(hits) ** 2 / count
 
-        return Score(0, new_estimation, lb, ub, new_count)
+        score = Score(0, new_estimation, -np.inf, np.inf, new_count, n_batches, batch_sum_squares)
+        lb, ub = BOUNDS[self.bounds](new_estimation, new_count, self.p, **self._bounds_kwargs(score))
+
+        return Score(0, new_estimation, lb, ub, new_count, n_batches, batch_sum_squares)
+
+    def reduce_uncertainty_to(self, estimation: Score, width: float) -> int:
+        n_points = get_sample_size(self.bounds)(estimation.uncertain_component, width, self.p,
+                                                **self._bounds_kwargs(estimation))
+        return max(n_points - estimation.n_points_estimation, 0)
+
+    def _bounds_kwargs(self, estimation: Score) -> dict:
+        if self.bounds not in VARIANCE_BOUNDS:
+            return {}
+
+        return {'design_effect': self.design_effect(estimation)}
+
+    def design_effect(self, estimation: Score) -> float:
+        """
+        Variance of the estimate relative to i.i.d. sampling, from the spread of the means of its batches: with
+        batches of sizes $n_i$ and means $m_i$, $\\sum_i n_i (m_i - m)^2 / (B - 1)$ estimates the per point variance
+        of the sampling, $m (1 - m)$ under i.i.d. sampling. The upper confidence bound (with probability p) of that
+        estimate is used, and the result is kept between 1 / max_variance_reduction and 1.
+        """
+        mean = estimation.uncertain_component
+        iid_variance = mean * (1 - mean)
+        if estimation.n_batches < self.min_batches or iid_variance == 0:
+            return 1.
 
-    def reduce_uncertainty_to(self, estimation: Score, width: float):
-        return super().reduce_uncertainty_to(estimation, width)
+        dof = estimation.n_batches - 1
+        variance = (estimation.batch_sum_squares - estimation.n_points_estimation * mean ** 2) / dof
+        variance_ub = variance * dof / chi2.ppf(self.p, dof)
+        return float(np.clip(variance_ub / iid_variance, 1 / self.max_variance_reduction, 1.))
 
     def is_estimation(self):
         return True
@@ -89,7 +147,7 @@ class SizeMetric(Metric):
         bins = structure.bins
         return Score(np.sum(bins[:, 1] - bins[:, 0], axis=-1), 0, 0, 0, 0)
 
-    def reduce_uncertainty_to(self, estimation: Score, width: float):
+    def reduce_uncertainty_to(self, estimation: Score, width: float) -> int:
         return 0
 
     def is_estimation(self):
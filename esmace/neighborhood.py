@@ -1,10 +1,125 @@
+import numpy as np
+
+from esmace.discretizer import Discretizer
+from esmace.structure import Structure
+from esmace.utils import check_is_fitted
+
+
 class Neighborhood:
 
+    def fit(self, X: np.ndarray, discretizer: Discretizer) -> None:
+        """
+        Called by the explainer before each search with its training data and fitted discretizer.
+        """
+        pass
+
     def check_inside(self, structure) -> bool:
         pass
 
+    def check_inside_many(self, bins: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            bins: (n_structures, n_features, 2) array with the bins of the structures to check.
+
+        Returns:
+            boolean mask with the structures that are inside the neighborhood.
+        """
+        return np.array([self.check_inside(Structure(structure_bins)) for structure_bins in bins], dtype=bool)
+
 
 class NoNeighborhood(Neighborhood):
 
     def check_inside(self, structure) -> bool:
         return True
+
+    def check_inside_many(self, bins: np.ndarray) -> np.ndarray:
+        return np.ones(len(bins), dtype=bool)
+
+
+class DataSupportNeighborhood(Neighborhood):
+    """
+    Structures with at least min_support training points inside, and whose density of training points is at least
+    min_density times the density of a uniform distribution over the discretizer area.
+
+    The training points are indexed by bin: for each feature and bin b, a bitmap of the rows whose bin is at most b.
+    The rows inside a range of bins are the difference of two of them, and the support of a structure is the popcount
+    of the AND of one range per feature. The index takes n_features * (num_bins + 1) * n_rows / 8 bytes.
+    """
+
+    def __init__(self, min_support: int = 1, min_density: float = 0.) -> None:
+        super().__init__()
+        self.min_support = min_support
+        self.min_density = min_density
+
+    def fit(self, X: np.ndarray, discretizer: Discretizer) -> None:
+        # The explainer refits before every search, the index is only rebuilt for new data or bins
+        fingerprint = (X.shape, discretizer.bin_start_.tobytes())
+        if getattr(self, 'fingerprint_', None) == fingerprint:
+            return
+
+        obs_bins = discretizer.to_obs_bins_many(X)
+        n_rows, n_features = obs_bins.shape
+        upper_bins = np.arange(discretizer.num_bins_feature_.max())
+
+        # cumulative_[f, b + 1] has the rows with bin <= b of feature f, and cumulative_[f, 0] none
+        n_bytes = 8 * int(np.ceil(n_rows / 64))
+        cumulative = np.zeros((n_features, len(upper_bins) + 1, n_bytes), dtype=np.uint8)
+        for feat in range(n_features):
+            packed = np.packbits(obs_bins[:, feat] <= upper_bins[:, None], axis=1)
+            cumulative[feat, 1:, :packed.shape[1]] = packed
+
+        bin_start = discretizer.bin_start_
+        feature_range = bin_start[:, -1] - bin_start[:, 0]
+        feature_range[feature_range == 0] = 1
+
+        self.cumulative_ = cumulative.view(np.uint64)
+        self.bin_edges_ = (bin_start - bin_start[:, :1]) / feature_range[:, None]
+        self.num_bins_feature_ = discretizer.num_bins_feature_
+        self.n_points_ = n_rows
+        self.fingerprint_ = fingerprint
+
+    def support_many(self, bins: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            bins: (n_structures, n_features, 2) array with the bins of the structures.
+
+        Returns:
+            number of training points inside each structure.
+        """
+        check_is_fitted(self)
+        bins = np.asarray(bins)
+        low, high = bins[:, :, 0], bins[:, :, 1]
+        full = (low == 0) & (high == self.num_bins_feature_ - 1)
+
+        # Starts from every row, the padding bits of the last word stay unset
+        inside = np.repeat(self.cumulative_[0, -1][None], len(bins), axis=0)
+        for feat in range(bins.shape[1]):
+            if np.all(full[:, feat]):
+                continue
+
+            inside &= self.cumulative_[feat, high[:, feat] + 1] & ~self.cumulative_[feat, low[:, feat]]
+
+        return _POPCOUNT[inside.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+    def check_inside(self, structure) -> bool:
+        return bool(self.check_inside_many(structure.bins[None])[0])
+
+    def check_inside_many(self, bins: np.ndarray) -> np.ndarray:
+        bins = np.asarray(bins)
+        support = self.support_many(bins)
+        inside = support >= self.min_support
+
+        if self.min_density > 0:
+            feat = np.arange(bins.shape[1])
+            widths = self.bin_edges_[feat, bins[:, :, 1] + 1] - self.bin_edges_[feat, bins[:, :, 0]]
+
+            # In logs, the volume of a structure in many features underflows
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_density = np.log(support / self.n_points_) - np.sum(np.log(widths), axis=1)
+                inside &= log_density >= np.log(self.min_density)
+
+        return inside
+
+
+# Number of set bits of every byte
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
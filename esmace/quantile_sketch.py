@@ -0,0 +1,106 @@
+from typing import Sequence
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    KLL sketch (Karnin, Lang & Liberty, 2016) of the quantiles of every column of a stream of rows, in bounded memory.
+
+    Level h of the sketch holds values that each stand for 2^h rows, at most about k (2 / 3)^(H - 1 - h) of them for
+    H levels. A full level is sorted and every other value, starting at a random offset, is promoted to the next
+    level. All columns share the levels, as every row adds one value to each. The rank error of a quantile is about
+    1.7 / k of the number of rows, and sketches of separate shards can be merged.
+    """
+
+    def __init__(self, k: int = 200, seed: int = None) -> None:
+        self.k = k
+        self.random_state = np.random.RandomState(seed)
+        self.compactors_ = []
+        self.n_ = 0
+        self.min_ = None
+        self.max_ = None
+
+    def update(self, X: np.ndarray) -> 'KLLSketch':
+        """
+        Args:
+            X: (n_rows, n_features) chunk of the stream.
+        """
+        X = np.asarray(X, dtype=float)
+        if len(X) == 0:
+            return self
+
+        self._add(0, X)
+        self._update_range(X.min(axis=0), X.max(axis=0), len(X))
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """
+        Add the rows summarized by other, e.g. a sketch fitted on another shard, to this sketch.
+        """
+        if other.n_ == 0:
+            return self
+
+        for level, values in enumerate(other.compactors_):
+            self._add(level, values)
+
+        self._update_range(other.min_, other.max_, other.n_)
+        self._compress()
+        return self
+
+    def quantile(self, q: Sequence[float]) -> np.ndarray:
+        """
+        Returns:
+            (len(q), n_features) array with the approximate q quantiles of each column. The quantiles 0 and 1 are
+            the exact minimum and maximum.
+        """
+        if self.n_ == 0:
+            raise ValueError('The sketch is empty')
+
+        q = np.asarray(q, dtype=float)
+        values = np.concatenate(self.compactors_)
+        weights = np.concatenate([np.full(len(values), 2 ** level) for level, values in enumerate(self.compactors_)])
+
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        cumulative_weights = np.cumsum(weights[order], axis=0)
+
+        # First value whose cumulative weight reaches the rank of each quantile
+        ranks = q[:, None, None] * cumulative_weights[-1]
+        positions = np.argmax(cumulative_weights[None] >= ranks, axis=1)
+        quantiles = np.take_along_axis(values, positions, axis=0)
+
+        quantiles[q <= 0] = self.min_
+        quantiles[q >= 1] = self.max_
+        return quantiles
+
+    def _add(self, level: int, values: np.ndarray):
+        if level == len(self.compactors_):
+            self.compactors_.append(values)
+        else:
+            self.compactors_[level] = np.concatenate((self.compactors_[level], values))
+
+    def _update_range(self, minimum: np.ndarray, maximum: np.ndarray, n_rows: int):
+        if self.n_ == 0:
+            self.min_, self.max_ = minimum.copy(), maximum.copy()
+        else:
+            self.min_, self.max_ = np.minimum(self.min_, minimum), np.maximum(self.max_, maximum)
+        self.n_ += n_rows
+
+    def _capacity(self, level: int) -> int:
+        return max(int(np.ceil(self.k * (2 / 3) ** (len(self.compactors_) - 1 - level))), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors_):
+            values = self.compactors_[level]
+            if len(values) > self._capacity(level):
+                values = np.sort(values, axis=0)
+                # With an odd number of values, the largest stays so that the total weight is kept
+                n_kept = len(values) % 2
+                kept, values = values[len(values) - n_kept:], values[:len(values) - n_kept]
+
+                self.compactors_[level] = kept
+                self._add(level + 1, values[self.random_state.randint(2)::2])
+            level += 1
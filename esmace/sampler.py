@@ -1,16 +1,73 @@
-from typing import Callable, Tuple
+import queue
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
+from scipy.stats import qmc
 
 from esmace.discretizer import Discretizer
 from esmace.structure import Structure
 from esmace.utils import check_is_fitted
 
 
+class PredictionCache:
+    """
+    Labelled points of each sampled region (structure), kept while their total size is below max_bytes.
+    The least recently used regions are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20) -> None:
+        self.max_bytes = max_bytes
+        self.regions = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, structure: Structure, n_points: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        region = self.regions.get(structure.key)
+
+        if region is None or len(region[0]) < n_points:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.regions.move_to_end(structure.key)
+        X, y = region
+        return X[:n_points], y[:n_points]
+
+    def put(self, structure: Structure, X: np.ndarray, y: np.ndarray) -> None:
+        region = self.regions.pop(structure.key, None)
+
+        if region is not None:
+            self.n_bytes -= _n_bytes(*region)
+            X, y = np.concatenate((region[0], X)), np.concatenate((region[1], y))
+
+        if _n_bytes(X, y) > self.max_bytes:
+            return
+
+        self.regions[structure.key] = (X, y)
+        self.n_bytes += _n_bytes(X, y)
+
+        while self.n_bytes > self.max_bytes:
+            _, evicted = self.regions.popitem(last=False)
+            self.n_bytes -= _n_bytes(*evicted)
+
+    def clear(self) -> None:
+        self.regions.clear()
+        self.n_bytes = 0
+
+
 class Sampler:
 
     def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray]) -> None:
         self.predict_fn = predict_fn
+        self.n_model_calls = 0
+        self.n_points_predicted = 0
+        self.predict_time = 0.
 
     def sample(self, structure: Structure, n_points: float) -> Tuple[np.ndarray, np.ndarray]:
         raise NotImplemented()
@@ -18,6 +75,41 @@ class Sampler:
     def initial_sampling(self, structure: Structure, n_points: float) -> Tuple[np.ndarray, np.ndarray]:
         return self.sample(structure, n_points)
 
+    def sample_many(self, structures: List[Structure],
+                    n_points: Union[int, Sequence[int]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        n_points = _broadcast_n_points(structures, n_points)
+        return [self.sample(structure, n) for structure, n in zip(structures, n_points)]
+
+    def initial_sampling_many(self, structures: List[Structure], n_points: Union[int, Sequence[int]],
+                              parents: List[Structure] = None,
+                              parents_samples: List[Tuple[np.ndarray, np.ndarray]] = None
+                              ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Args:
+            parents: optional structure each one was expanded from, samplers may reuse the work done on it.
+            parents_samples: optional points and labels already sampled in each parent.
+        """
+        n_points = _broadcast_n_points(structures, n_points)
+        return [self.initial_sampling(structure, n) for structure, n in zip(structures, n_points)]
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        # Every call to the model goes through here, so that its calls, points and time are counted
+        start = time.perf_counter()
+        y = self.predict_fn(X)
+        self.predict_time += time.perf_counter() - start
+        self.n_model_calls += 1
+        self.n_points_predicted += len(X)
+        return y
+
+    def set_seed(self, seed: int) -> None:
+        pass
+
+    def prefetch(self, structures: List[Structure]) -> None:
+        """
+        Hint that the structures are likely to be sampled soon, samplers may start sampling them in the background.
+        """
+        pass
+
     def dataset_fit(self, X: np.ndarray) -> None:
         pass
 
@@ -25,20 +117,226 @@ class Sampler:
         pass
 
 
+SAMPLING_STRATEGIES = ('uniform', 'sobol', 'halton', 'stratified')
+
+
 class TabularSampler(Sampler):
 
-    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], seed=42) -> None:
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], seed=42,
+                 prediction_cache: PredictionCache = None, sampling: str = 'uniform', dtype=np.float64,
+                 label_dtype=None, chunk_size: int = None) -> None:
+        """
+        Args:
+            sampling: how the points of a structure are drawn. 'uniform' draws i.i.d. uniform points, 'sobol' and
+                'halton' scrambled low discrepancy sequences, and 'stratified' a latin hypercube of each draw, so
+                that every bin of the structure gets its share of points. The last three reduce the variance of
+                the estimates, see the 'variance_wilson' bounds of FidelityMetric.
+            dtype: of the sampled points, e.g. np.float32 to halve their memory.
+            label_dtype: optional dtype the predictions are stored as, e.g. np.uint8 for class labels.
+            chunk_size: optional maximum number of points generated and predicted at once. Larger requests are
+                written chunk by chunk into their output arrays, bounding the memory on top of the result.
+        """
         super().__init__(predict_fn)
+        if sampling not in SAMPLING_STRATEGIES:
+            raise ValueError(f'Unknown sampling {sampling}, available strategies are {list(SAMPLING_STRATEGIES)}')
+
+        self.random_state = np.random.RandomState(seed)
+        self.prediction_cache = prediction_cache
+        self.sampling = sampling
+        self.dtype = dtype
+        self.label_dtype = label_dtype
+        self.chunk_size = chunk_size
+
+    def set_seed(self, seed: int) -> None:
         self.random_state = np.random.RandomState(seed)
+        if hasattr(self, 'n_features_'):
+            self.sequence_ = self._new_sequence(self.random_state)
+
+    def _new_sequence(self, random_state: np.random.RandomState) -> Optional[qmc.QMCEngine]:
+        # Scrambled with a seed drawn from random_state, so the sequence is reproducible per seed
+        if self.sampling == 'sobol':
+            return qmc.Sobol(self.n_features_, scramble=True, seed=random_state.randint(np.iinfo(np.int32).max))
+        elif self.sampling == 'halton':
+            return qmc.Halton(self.n_features_, scramble=True, seed=random_state.randint(np.iinfo(np.int32).max))
+        return None
 
     def sample(self, structure: Structure, n_points: float) -> Tuple[np.ndarray, np.ndarray]:
+        return self.sample_many([structure], [n_points])[0]
+
+    def sample_many(self, structures: List[Structure],
+                    n_points: Union[int, Sequence[int]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Sample the points of every structure and label them with a single stacked call to predict_fn, or one call
+        per chunk of chunk_size points.
+        """
         check_is_fitted(self)
-        X = self.random_state.uniform(size=(n_points, self.n_features_))
-        X_scaled = self._project(structure, X)
-        y = self.predict_fn(X_scaled)
-        return X_scaled, y
+        n_points = _broadcast_n_points(structures, n_points)
+        samples = self._sample_predict(structures, n_points)
+
+        if self.prediction_cache is not None:
+            for structure, (X_structure, y_structure) in zip(structures, samples):
+                self.prediction_cache.put(structure, X_structure, y_structure)
+
+        return samples
+
+    def _sample_predict(self, structures: List[Structure], n_points: List[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        n_total = sum(n_points)
+        if self.chunk_size is None or n_total <= self.chunk_size:
+            return self._sample_predict_chunk(structures, n_points)
+
+        # Each chunk is written into the outputs, only the points of one chunk are in flight
+        X_out = [np.empty((n, self.n_features_), dtype=self.dtype) for n in n_points]
+        y_out = None
+        offsets = np.concatenate(([0], np.cumsum(n_points, dtype=np.int64)))
+
+        for start in range(0, n_total, self.chunk_size):
+            stop = min(start + self.chunk_size, n_total)
+            pieces = [(i, max(start, offsets[i]) - offsets[i], min(stop, offsets[i + 1]) - offsets[i])
+                      for i in range(np.searchsorted(offsets, start, side='right') - 1, len(structures))
+                      if offsets[i] < stop and offsets[i + 1] > start]
+
+            chunk = self._sample_predict_chunk([structures[i] for i, _, _ in pieces],
+                                               [high - low for _, low, high in pieces])
+
+            for (i, low, high), (X, y) in zip(pieces, chunk):
+                if y_out is None:
+                    y_out = [np.empty((n,) + y.shape[1:], dtype=y.dtype) for n in n_points]
+
+                X_out[i][low:high] = X
+                y_out[i][low:high] = y
+
+        return list(zip(X_out, y_out))
+
+    def _sample_predict_chunk(self, structures: List[Structure],
+                              n_points: List[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # int64 also when n_points is empty, e.g. when every request was found in the prediction cache
+        offsets = np.concatenate(([0], np.cumsum(n_points, dtype=np.int64)))
+        if offsets[-1] == 0:
+            return [(np.empty((0, self.n_features_), dtype=self.dtype), np.empty(0, dtype=self.label_dtype))
+                    for _ in structures]
+
+        U = self._uniform(offsets[-1])
+        X = np.empty(U.shape, dtype=self.dtype)
+        for i, structure in enumerate(structures):
+            X[offsets[i]:offsets[i + 1]] = self._project(structure, U[offsets[i]:offsets[i + 1]])
+
+        splits = offsets[1:-1]
+
+        y = np.asarray(self._predict(X))
+        if self.label_dtype is not None:
+            y = y.astype(self.label_dtype, copy=False)
+
+        return list(zip(np.split(X, splits), np.split(y, splits)))
+
+    def _uniform(self, n_points: int) -> np.ndarray:
+        return _draw_unit(self.sequence_, self.random_state, (n_points, self.n_features_))
+
+    def initial_sampling_many(self, structures: List[Structure], n_points: Union[int, Sequence[int]],
+                              parents: List[Structure] = None,
+                              parents_samples: List[Tuple[np.ndarray, np.ndarray]] = None
+                              ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Args:
+            parents_samples: optional points and labels already sampled in each parent. A structure that only widens
+                one feature of its parent reuses those inside the parent and is sampled only in the added slabs.
+        """
+        n_points = _broadcast_n_points(structures, n_points)
+        parents = parents if parents is not None else [None] * len(structures)
+        parents_samples = parents_samples if parents_samples is not None else [None] * len(structures)
+
+        samples = [None] * len(structures)
+        requests, request_structures, request_n_points = [], [], []
+
+        for i, (structure, n, parent, parent_sample) in enumerate(zip(structures, n_points, parents, parents_samples)):
+            reuse = self._slab_sampling_sizes(structure, n, parent, parent_sample)
+
+            if reuse is None and self.prediction_cache is not None:
+                # A region that was already sampled enough reuses its stored labels
+                samples[i] = self.prediction_cache.get(structure, n)
+
+            if reuse is not None:
+                reused, slabs = reuse
+                samples[i] = parent_sample[0][reused], parent_sample[1][reused]
+                for slab, n_slab in slabs:
+                    if n_slab == 0:
+                        continue
+
+                    requests.append(i)
+                    request_structures.append(slab)
+                    request_n_points.append(n_slab)
+            elif samples[i] is None:
+                requests.append(i)
+                request_structures.append(structure)
+                request_n_points.append(n)
+
+        # Fresh structures and slabs are sampled together
+        new_samples = self.sample_many(request_structures, request_n_points)
+
+        for i, (X, y) in zip(requests, new_samples):
+            if samples[i] is None:
+                samples[i] = X, y
+            else:
+                samples[i] = np.concatenate((samples[i][0], X)), np.concatenate((samples[i][1], y))
+
+        return samples
+
+    def _slab_sampling_sizes(self, structure: Structure, n_points: int, parent: Structure,
+                             parent_sample: Tuple[np.ndarray, np.ndarray]
+                             ) -> Optional[Tuple[np.ndarray, List[Tuple[Structure, int]]]]:
+        """
+        When structure only widens one feature of parent, a uniform sample of the child is made of uniform points of
+        the parent and of the added slabs, each in proportion to its volume. The slabs share every other feature with
+        the parent, so volume ratios are ratios of widths in the widened feature.
+
+        The parent points are a random subset of the parent sample. A prefix would not do: the sample of the parent
+        is itself its reused points followed by its slabs, so the oldest regions would be over-represented after a
+        few expansions.
+
+        Returns:
+            the indices of the parent points to reuse and the slabs to sample with their number of points, or None if
+            the parent points cannot be reused.
+        """
+        if parent is None or parent_sample is None:
+            return None
+
+        changed = np.flatnonzero(np.any(structure.bins != parent.bins, axis=1))
+        if len(changed) != 1 or not _contains(structure, parent):
+            return None
+
+        feat = changed[0]
+        bin_start = self.discretizer_.bin_start_[feat]
+        (low, high), (parent_low, parent_high) = structure.bins[feat], parent.bins[feat]
+        width = bin_start[high + 1] - bin_start[low]
+        parent_fraction = (bin_start[parent_high + 1] - bin_start[parent_low]) / width if width > 0 else 0
+
+        # Parent points cover parent_fraction of the child, there may not be enough of them for n_points
+        n_parent = len(parent_sample[0])
+        n_total = n_points if n_points is not None else np.inf
+        n_total = min(n_total, n_parent / parent_fraction) if parent_fraction > 0 else 0
+        n_reused = min(n_parent, self._stochastic_round(n_total * parent_fraction))
+        if n_reused == 0:
+            return None
+
+        slabs = []
+        for slab_low, slab_high in ((low, parent_low - 1), (parent_high + 1, high)):
+            if slab_low > slab_high:
+                continue
+
+            slab_bins = np.copy(structure.bins)
+            slab_bins[feat] = slab_low, slab_high
+            slab_fraction = (bin_start[slab_high + 1] - bin_start[slab_low]) / width
+            slabs.append((Structure(slab_bins), self._stochastic_round(n_total * slab_fraction)))
+
+        return self.random_state.choice(n_parent, n_reused, replace=False), slabs
+
+    def _stochastic_round(self, value: float) -> int:
+        # Rounds up with probability equal to the fractional part, keeping the expected value
+        return int(np.floor(value + self.random_state.uniform()))
 
     def _project(self, structure: Structure, X: np.ndarray):
+        if self.sampling == 'stratified':
+            X = _latin_hypercube(X, self.random_state)
+
         bins = structure.bins
         bin_start = self.discretizer_.bin_start_
         min_val = bin_start[self.feat_arange_, bins[:, 0]]
@@ -49,45 +347,316 @@ class TabularSampler(Sampler):
 
     def fit_discretizer(self, discretizer: Discretizer):
         check_is_fitted(discretizer)
+        # The regions of the prediction cache are keyed by bins, their points only hold for the same bin starts
+        bin_start = discretizer.bin_start_.tobytes()
+        if self.prediction_cache is not None and bin_start != getattr(self, 'cache_bin_start_', None):
+            self.prediction_cache.clear()
+        self.cache_bin_start_ = bin_start
+
         self.discretizer_ = discretizer
         self.n_features_ = discretizer.n_features()
         self.feat_arange_ = np.arange(self.n_features_).astype(int)
+        self.sequence_ = self._new_sequence(self.random_state)
 
 
 class CachingTabularSampler(TabularSampler):
 
-    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], n_points_cache=10_000, seed=42) -> None:
-        super().__init__(predict_fn, seed=seed)
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], n_points_cache=10_000, seed=42,
+                 prediction_cache: PredictionCache = None, max_cached_indices=10_000_000,
+                 sampling: str = 'uniform', dtype=np.float64, label_dtype=None, chunk_size: int = None) -> None:
+        super().__init__(predict_fn, seed=seed, prediction_cache=prediction_cache, sampling=sampling, dtype=dtype,
+                         label_dtype=label_dtype, chunk_size=chunk_size)
         self.n_points_cache = n_points_cache
-        self.previous_area = None
+        self.max_cached_indices = max_cached_indices
+        self.previous_bin_start = None
 
     def _cache_points(self):
-        new_area = self.discretizer_.discretizer_area()
-        if new_area != self.previous_area:
-            self.X_cache_, self.y_cache_ = self.sample(new_area, self.n_points_cache)
+        # Compared by bin starts, the bin indices of the area are the same for any fit of the discretizer
+        bin_start = self.discretizer_.bin_start_.tobytes()
+        if bin_start != self.previous_bin_start:
+            self.X_cache_, self.y_cache_ = self.sample(self.discretizer_.discretizer_area(), self.n_points_cache)
+            self._index_points()
+            self.previous_bin_start = bin_start
+
+    def _index_points(self):
+        """
+        Index the cached points by bin: for each feature, the points sorted by bin and the offset where each bin
+        starts, so the points inside any range of bins are a contiguous slice of cache_order_[feature].
+        """
+        bin_start = self.discretizer_.bin_start_
+        num_bins = self.discretizer_.num_bins_feature_
+
+        # Smallest integer type for the bins, np.uint8 unless a feature has more than 256 bins
+        self.cache_bins_ = np.empty(self.X_cache_.shape, dtype=np.min_scalar_type(num_bins.max() - 1))
+        self.cache_order_ = np.empty((self.n_features_, len(self.X_cache_)), dtype=np.int32)
+        self.cache_offsets_ = np.empty((self.n_features_, num_bins.max() + 1), dtype=np.int64)
+
+        for feat in range(self.n_features_):
+            feat_bins = np.searchsorted(bin_start[feat], self.X_cache_[:, feat], side='right') - 1
+            self.cache_bins_[:, feat] = np.clip(feat_bins, 0, num_bins[feat] - 1)
+            self.cache_order_[feat] = np.argsort(self.cache_bins_[:, feat], kind='stable')
+            self.cache_offsets_[feat] = np.searchsorted(self.cache_bins_[self.cache_order_[feat], feat],
+                                                        np.arange(self.cache_offsets_.shape[1]))
+
+        self.inside_cache_ = OrderedDict()
+        self.n_cached_indices_ = 0
 
     def fit_discretizer(self, discretizer: Discretizer):
         super().fit_discretizer(discretizer)
         self._cache_points()
 
-    def initial_sampling(self, structure: Structure, n_points: float) -> Tuple[np.ndarray, np.ndarray]:
+    def initial_sampling(self, structure: Structure, n_points: float,
+                         parent: Structure = None) -> Tuple[np.ndarray, np.ndarray]:
         check_is_fitted(self)
 
-        cache_mask = self._filter_points_by_structure(self.X_cache_, structure)
-        X_inside = self.X_cache_[cache_mask]
-        y_inside = self.y_cache_[cache_mask]
+        inside = self._filter_points_by_structure(structure, parent)
 
         if n_points is not None:
-            X_inside = X_inside[:n_points]
-            y_inside = y_inside[:n_points]
-        
-        return X_inside, y_inside
-        
-    def _filter_points_by_structure(self, X: np.ndarray, structure: Structure):
-        mask = np.ones(len(X)).astype(int)
-
-        for feat in range(self.discretizer_.n_features()):
-            low, high = structure.bins[feat]
-            mask &= (X[:, feat] >= low) & (X[:, feat] <= high)
-
-        return mask
\ No newline at end of file
+            inside = inside[:n_points]
+
+        return self.X_cache_[inside], self.y_cache_[inside]
+
+    def initial_sampling_many(self, structures: List[Structure], n_points: Union[int, Sequence[int]],
+                              parents: List[Structure] = None,
+                              parents_samples: List[Tuple[np.ndarray, np.ndarray]] = None
+                              ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Points come from the cache, there is no model call to batch nor to save by reusing the parent samples
+        n_points = _broadcast_n_points(structures, n_points)
+        parents = parents if parents is not None else [None] * len(structures)
+        return [self.initial_sampling(structure, n, parent) for structure, n, parent in
+                zip(structures, n_points, parents)]
+
+    def _filter_points_by_structure(self, structure: Structure, parent: Structure = None) -> np.ndarray:
+        """
+        Returns:
+            sorted indices of the cached points inside the structure.
+        """
+        inside = self.inside_cache_.get(structure.key)
+        if inside is not None:
+            self.inside_cache_.move_to_end(structure.key)
+            return inside
+
+        parent_inside = self.inside_cache_.get(parent.key) if parent is not None else None
+        changed = np.flatnonzero(np.any(structure.bins != parent.bins, axis=1)) if parent_inside is not None else []
+
+        if len(changed) == 1 and _contains(structure, parent):
+            # The child only adds the slabs of the changed feature to the points of its parent
+            feat = changed[0]
+            (low, high), (parent_low, parent_high) = structure.bins[feat], parent.bins[feat]
+            slabs = np.concatenate((self._points_in_bins(feat, low, parent_low - 1),
+                                    self._points_in_bins(feat, parent_high + 1, high)))
+            inside = np.sort(np.concatenate((parent_inside, self._filter_indices(slabs, structure))))
+        else:
+            # Start from the feature with the fewest points in its range and check the rest only on those
+            bins = structure.bins
+            sizes = self.cache_offsets_[self.feat_arange_, bins[:, 1] + 1] - \
+                self.cache_offsets_[self.feat_arange_, bins[:, 0]]
+            feat = np.argmin(sizes)
+            inside = np.sort(self._filter_indices(self._points_in_bins(feat, *bins[feat]), structure))
+
+        self._cache_inside(structure, inside)
+        return inside
+
+    def _points_in_bins(self, feat: int, low: int, high: int) -> np.ndarray:
+        if high < low:
+            return np.empty(0, dtype=np.int32)
+
+        return self.cache_order_[feat, self.cache_offsets_[feat, low]:self.cache_offsets_[feat, high + 1]]
+
+    def _filter_indices(self, indices: np.ndarray, structure: Structure) -> np.ndarray:
+        points_bins = self.cache_bins_[indices]
+        inside = np.all((points_bins >= structure.bins[:, 0]) & (points_bins <= structure.bins[:, 1]), axis=1)
+        return indices[inside]
+
+    def _cache_inside(self, structure: Structure, inside: np.ndarray):
+        if len(inside) > self.max_cached_indices:
+            return
+
+        self.inside_cache_[structure.key] = inside
+        self.n_cached_indices_ += len(inside)
+
+        while self.n_cached_indices_ > self.max_cached_indices:
+            _, evicted = self.inside_cache_.popitem(last=False)
+            self.n_cached_indices_ -= len(evicted)
+
+
+class PrefetchingTabularSampler(TabularSampler):
+    """
+    TabularSampler that overlaps point generation and model inference with the search. A background thread keeps
+    up to queue_depth batches of batch_size uniform points ready, and prefetch starts sampling and predicting
+    prefetch_points for likely pulls (e.g. the arms of mab_lub) in a worker thread. A prefetched batch is used by the
+    next pull of its structure, at most max_prefetched structures wait to be pulled.
+
+    predict_fn is called from the worker thread too. The points are independent of when they are drawn, but with
+    prefetching the order in which structures get them depends on thread timing, so results are not reproducible.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], seed=42,
+                 prediction_cache: PredictionCache = None, batch_size=10_000, queue_depth=4, prefetch_points=100,
+                 max_prefetched=64, sampling: str = 'uniform', dtype=np.float64, label_dtype=None,
+                 chunk_size: int = None) -> None:
+        super().__init__(predict_fn, seed=seed, prediction_cache=prediction_cache, sampling=sampling, dtype=dtype,
+                         label_dtype=label_dtype, chunk_size=chunk_size)
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.prefetch_points = prefetch_points
+        self.max_prefetched = max_prefetched
+        self._reset()
+
+    def _reset(self):
+        self._uniform_queue = None
+        self._stop = None
+        self._buffer = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._prefetched = OrderedDict()
+
+    def _start(self):
+        self._uniform_queue = queue.Queue(maxsize=self.queue_depth)
+        self._stop = threading.Event()
+        self._buffer = np.empty((0, self.n_features_))
+        # The generator gets its own random state, the explainer keeps using self.random_state
+        random_state = np.random.RandomState(self.random_state.randint(np.iinfo(np.int32).max))
+        threading.Thread(target=_generate_uniform, daemon=True,
+                         args=(self._uniform_queue, self._stop, self._new_sequence(random_state), random_state,
+                               (self.batch_size, self.n_features_))).start()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def close(self):
+        """
+        Stop the background threads, they are started again on the next sample.
+        """
+        if self._stop is not None:
+            self._stop.set()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._reset()
+
+    def set_seed(self, seed: int) -> None:
+        self.close()
+        super().set_seed(seed)
+
+    def fit_discretizer(self, discretizer: Discretizer):
+        self.close()
+        super().fit_discretizer(discretizer)
+
+    def _uniform(self, n_points: int) -> np.ndarray:
+        with self._lock:
+            if self._stop is None:
+                self._start()
+
+            chunks = []
+            while n_points > 0:
+                if len(self._buffer) == 0:
+                    self._buffer = self._uniform_queue.get()
+
+                chunks.append(self._buffer[:n_points])
+                self._buffer = self._buffer[n_points:]
+                n_points -= len(chunks[-1])
+
+            return np.concatenate(chunks) if chunks else np.empty((0, self.n_features_))
+
+    def prefetch(self, structures: List[Structure]) -> None:
+        check_is_fitted(self)
+        structures = [structure for structure in structures if structure.key not in self._prefetched]
+        structures = structures[:self.max_prefetched]
+        if len(structures) == 0:
+            return
+
+        if self._stop is None:
+            with self._lock:
+                self._start()
+
+        future = self._executor.submit(self._sample_predict, structures, [self.prefetch_points] * len(structures))
+        for i, structure in enumerate(structures):
+            self._prefetched[structure.key] = future, i
+
+        while len(self._prefetched) > self.max_prefetched:
+            self._prefetched.popitem(last=False)
+
+    def sample_many(self, structures: List[Structure],
+                    n_points: Union[int, Sequence[int]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        check_is_fitted(self)
+        n_points = _broadcast_n_points(structures, n_points)
+        samples = [self._pop_prefetched(structure, n) for structure, n in zip(structures, n_points)]
+
+        # Whatever the prefetched points do not cover is sampled in a single call
+        missing = [n - len(sample[0]) for sample, n in zip(samples, n_points)]
+        new_samples = super().sample_many(structures, missing) if sum(missing) > 0 else None
+
+        for i, (X, y) in enumerate(samples):
+            if missing[i] == 0:
+                continue
+
+            if len(X) == 0:
+                samples[i] = new_samples[i]
+            else:
+                samples[i] = np.concatenate((X, new_samples[i][0])), np.concatenate((y, new_samples[i][1]))
+
+        return samples
+
+    def _pop_prefetched(self, structure: Structure, n_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        prefetched = self._prefetched.pop(structure.key, None)
+        if prefetched is None:
+            return np.empty((0, self.n_features_)), np.empty(0)
+
+        future, i = prefetched
+        X, y = future.result()[i]
+        return X[:n_points], y[:n_points]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute in ('_uniform_queue', '_stop', '_buffer', '_lock', '_executor', '_prefetched'):
+            state.pop(attribute)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+
+def _generate_uniform(uniform_queue: queue.Queue, stop: threading.Event, sequence: Optional[qmc.QMCEngine],
+                      random_state: np.random.RandomState, shape: Tuple[int, int]):
+    while not stop.is_set():
+        batch = _draw_unit(sequence, random_state, shape)
+
+        while not stop.is_set():
+            try:
+                uniform_queue.put(batch, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+def _draw_unit(sequence: Optional[qmc.QMCEngine], random_state: np.random.RandomState,
+               shape: Tuple[int, int]) -> np.ndarray:
+    if sequence is None:
+        return random_state.uniform(size=shape)
+
+    with warnings.catch_warnings():
+        # Sobol' points are only balanced in powers of 2, the draws of the search have any size
+        warnings.simplefilter('ignore', UserWarning)
+        return sequence.random(shape[0])
+
+
+def _latin_hypercube(X: np.ndarray, random_state: np.random.RandomState) -> np.ndarray:
+    # Each feature of the n points falls in a different one of n equal strata, X places the point inside its stratum
+    strata = np.argsort(random_state.uniform(size=X.shape), axis=0)
+    return (strata + X) / max(len(X), 1)
+
+
+def _contains(structure: Structure, other: Structure) -> bool:
+    return bool(np.all(structure.bins[:, 0] <= other.bins[:, 0]) and np.all(structure.bins[:, 1] >= other.bins[:, 1]))
+
+
+def _broadcast_n_points(structures: List[Structure], n_points: Union[int, Sequence[int]]) -> List[int]:
+    if n_points is None or np.isscalar(n_points):
+        return [n_points] * len(structures)
+
+    if len(n_points) != len(structures):
+        raise ValueError(f'Got {len(n_points)} sample sizes for {len(structures)} structures')
+
+    return list(n_points)
+
+
+def _n_bytes(X: np.ndarray, y: np.ndarray) -> int:
+    return X.nbytes + y.nbytes
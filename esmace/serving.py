@@ -0,0 +1,269 @@
+import asyncio
+import http.client
+import io
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from esmace.utils import dataclass
+
+
+@dataclass(slots=True, frozen=False)
+class BatchingStats:
+    n_requests: int = 0
+    n_batches: int = 0
+    n_points: int = 0
+    max_batch_size: int = 0
+    total_latency: float = 0.
+    max_latency: float = 0.
+
+    @property
+    def mean_batch_size(self):
+        return self.n_points / self.n_batches if self.n_batches > 0 else 0.
+
+    @property
+    def mean_requests_per_batch(self):
+        return self.n_requests / self.n_batches if self.n_batches > 0 else 0.
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.n_requests if self.n_requests > 0 else 0.
+
+
+class BatchingPredictFn:
+    """
+    predict_fn wrapper that coalesces the calls of many threads (or coroutines, through apredict) into stacked
+    calls to predict_fn. A batch is flushed when it reaches max_batch_size points or when its first request has
+    waited max_wait seconds, and each caller gets back the predictions of its own points. Up to max_concurrency
+    batches are flushed at once, e.g. as many as the connections of an HTTPPredictFn; while all of them are in flight
+    the new requests wait in the queue and make the next batch larger.
+
+    Share one instance among the samplers of concurrent explanations to turn their small calls into few large ones.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], max_batch_size: int = 10_000,
+                 max_wait: float = 0.005, max_concurrency: int = 1) -> None:
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.stats = BatchingStats()
+        self._reset()
+
+    def _reset(self):
+        self._requests = queue.Queue()
+        self._stop = None
+        self._lock = threading.Lock()
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        return self.submit(X).result()
+
+    async def apredict(self, X: np.ndarray) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(X))
+
+    def submit(self, X: np.ndarray) -> Future:
+        with self._lock:
+            if self._stop is None:
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, args=(self._stop,), daemon=True).start()
+
+        future = Future()
+        self._requests.put((X, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        """
+        Stop the batching thread once the pending requests are flushed, it is started again on the next call.
+        """
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def _run(self, stop: threading.Event):
+        slots = threading.Semaphore(self.max_concurrency)
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            while not stop.is_set() or not self._requests.empty():
+                slots.acquire()
+                try:
+                    first = self._requests.get(timeout=0.1)
+                except queue.Empty:
+                    slots.release()
+                    continue
+
+                batch = [first]
+                n_points = len(first[0])
+                deadline = first[2] + self.max_wait
+
+                while n_points < self.max_batch_size:
+                    # Past the deadline, e.g. after waiting for a slot, only the requests already queued are added
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        request = self._requests.get(block=remaining > 0, timeout=max(remaining, 0))
+                    except queue.Empty:
+                        break
+
+                    batch.append(request)
+                    n_points += len(request[0])
+
+                executor.submit(self._flush, batch).add_done_callback(lambda _: slots.release())
+
+    def _flush(self, batch: List[Tuple[np.ndarray, Future, float]]):
+        sizes = [len(X) for X, _, _ in batch]
+
+        try:
+            y = self.predict_fn(np.concatenate([X for X, _, _ in batch]))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        latencies = []
+        for (_, future, submitted), y_request in zip(batch, np.split(y, np.cumsum(sizes)[:-1])):
+            future.set_result(y_request)
+            latencies.append(time.perf_counter() - submitted)
+
+        with self._lock:
+            self.stats.total_latency += sum(latencies)
+            self.stats.max_latency = max(self.stats.max_latency, *latencies)
+            self.stats.n_requests += len(batch)
+            self.stats.n_batches += 1
+            self.stats.n_points += sum(sizes)
+            self.stats.max_batch_size = max(self.stats.max_batch_size, sum(sizes))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute in ('_requests', '_stop', '_lock'):
+            state.pop(attribute)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+
+class ModelServer:
+    """
+    Local stand-in for a model server, for testing: serves predict_fn over HTTP. POST /predict takes the points as
+    an .npy body and answers with the predictions, also as .npy.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], host: str = '127.0.0.1', port: int = 0) -> None:
+        self.predict_fn = predict_fn
+        self.host = host
+        self.port = port
+        self.server_ = None
+
+    def start(self) -> 'ModelServer':
+        predict_fn = self.predict_fn
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Without it, the answer written after the headers waits for the delayed ACK of the client (~40 ms)
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                X = _from_npy(self.rfile.read(int(self.headers['Content-Length'])))
+                try:
+                    body, status = _to_npy(predict_fn(X)), 200
+                except Exception as e:
+                    body, status = str(e).encode(), 500
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server_ = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server_.daemon_threads = True
+        threading.Thread(target=self.server_.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_.server_address[:2]
+        return f'http://{host}:{port}/predict'
+
+    def stop(self):
+        if self.server_ is not None:
+            self.server_.shutdown()
+            self.server_.server_close()
+            self.server_ = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class HTTPPredictFn:
+    """
+    predict_fn that sends the points to a model server (such as ModelServer), keeping up to pool_size keep-alive
+    connections open so concurrent calls do not pay a new connection each. Behind a BatchingPredictFn, only
+    max_concurrency requests are in flight at once, so set it up to pool_size.
+    """
+
+    def __init__(self, url: str, pool_size: int = 4, timeout: float = 30.) -> None:
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self):
+        self._connections = queue.LifoQueue()
+        self._slots = threading.Semaphore(self.pool_size)
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        with self._slots:
+            try:
+                connection = self._connections.get_nowait()
+            except queue.Empty:
+                parsed = urlparse(self.url)
+                connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=self.timeout)
+
+            try:
+                connection.request('POST', urlparse(self.url).path, body=_to_npy(X),
+                                   headers={'Content-Type': 'application/octet-stream'})
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                raise
+
+            self._connections.put(connection)
+
+        if response.status != 200:
+            raise RuntimeError(f'Model server answered {response.status}: {body.decode(errors="replace")}')
+
+        return _from_npy(body)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute in ('_connections', '_slots'):
+            state.pop(attribute)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+
+def _to_npy(X: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(X), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _from_npy(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(data), allow_pickle=False)
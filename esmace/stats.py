@@ -0,0 +1,79 @@
+import time
+from contextlib import contextmanager
+from dataclasses import field
+from typing import Dict, List
+
+from esmace.utils import dataclass
+
+
+@dataclass(slots=True, frozen=False)
+class SearchStats:
+    """
+    Counters of a single explanation search. stop_reason is why the search ended ('n_iterations', 'converged',
+    'budget', 'patience' or 'cache'), phase_times holds the wall time spent in each phase of the search
+    ('candidates', 'expansion', 'validation' and 'bandit'), predict_time is the part of it spent inside predict_fn.
+    """
+    n_iterations: int = 0
+    model_calls: int = 0
+    points_predicted: int = 0
+    predict_time: float = 0.
+    bandit_pulls: int = 0
+    points_pulled: int = 0
+    candidates_created: int = 0
+    candidates_evaluated: int = 0
+    candidates_pruned: int = 0
+    candidates_deduplicated: int = 0
+    candidates_invalid: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    wall_time: float = 0.
+    stop_reason: str = None
+    phase_times: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def cache_hit_rate(self):
+        n_lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / n_lookups if n_lookups > 0 else 0.
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0.) + time.perf_counter() - start
+
+    def add(self, other: 'SearchStats') -> None:
+        """
+        Add the counters and times of other, e.g. of a search that ran in another process.
+        """
+        for name in self.__dataclass_fields__:
+            value = getattr(other, name)
+            if name == 'phase_times':
+                for phase, phase_time in value.items():
+                    self.phase_times[phase] = self.phase_times.get(phase, 0.) + phase_time
+            elif name not in ('wall_time', 'stop_reason'):
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        stats = {name: getattr(self, name) for name in self.__dataclass_fields__}
+        stats['phase_times'] = dict(self.phase_times)
+        stats['cache_hit_rate'] = self.cache_hit_rate
+        return stats
+
+
+class SearchHooks:
+    """
+    Callbacks of the explanation search, e.g. to export its metrics. Subclasses override the events they need,
+    the explainer only calls them when hooks are given.
+    """
+
+    def on_iteration(self, iteration: int, beam: List, hall_of_fame: List, stats: SearchStats) -> None:
+        pass
+
+    def on_candidate_created(self, candidate) -> None:
+        # With a utility that needs no points the candidate is still lazy, see Explanation
+        pass
+
+    def on_pull(self, candidates: List, n_points: List[int]) -> None:
+        pass
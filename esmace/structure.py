@@ -1,3 +1,6 @@
+from dataclasses import field
+from typing import Iterable, List
+
 import numpy as np
 
 from esmace.utils import dataclass
@@ -6,9 +9,96 @@ from esmace.utils import dataclass
 @dataclass(frozen=True, slots=True)
 class Structure:
     bins: np.ndarray
+    key: bytes = field(init=False, repr=False, compare=False)
+    _hash: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # The bins never change, so the key and its hash are computed once
+        key = np.ascontiguousarray(self.bins, dtype=np.int64).tobytes()
+        object.__setattr__(self, 'key', key)
+        object.__setattr__(self, '_hash', hash(key))
 
     def __eq__(self, __o: object) -> bool:
-        return __o is not None and np.all(__o.bins == self.bins)
+        return isinstance(__o, Structure) and self.key == __o.key
 
     def __hash__(self) -> int:
-        return hash(tuple(self.bins.ravel()))
+        return self._hash
+
+    def __reduce__(self):
+        # The hash of bytes is salted per process, the key and its hash are recomputed when unpickled
+        return Structure, (self.bins,)
+
+
+class StructureEncoder:
+    """
+    Bit-packs the bins of structures into small bytes keys. Each bin limit of a feature takes
+    ceil(log2(num_bins)) bits, so a structure over 30 features with 10 bins is stored in 30 bytes.
+    """
+
+    def __init__(self, num_bins_feature: np.ndarray) -> None:
+        widths = np.maximum(1, np.ceil(np.log2(num_bins_feature))).astype(int)
+        # Left and right limits of each feature
+        self.widths = np.repeat(widths, 2)
+        self.max_width = int(widths.max())
+        self.n_bits = int(self.widths.sum())
+        self.bit_mask = np.arange(self.max_width)[None, :] < self.widths[:, None]
+
+    def encode_many(self, bins: np.ndarray) -> List[bytes]:
+        """
+        Args:
+            bins: (n_structures, n_features, 2) array of bins.
+
+        Returns:
+            list with the packed key of each structure.
+        """
+        bins = np.asarray(bins, dtype=np.int64).reshape(len(bins), -1)
+        bits = (bins[:, :, None] >> np.arange(self.max_width)) & 1
+        packed = np.packbits(bits[:, self.bit_mask].astype(np.uint8), axis=1)
+        return [row.tobytes() for row in packed]
+
+    def encode(self, structure: Structure) -> bytes:
+        return self.encode_many(structure.bins[None])[0]
+
+    def decode_many(self, keys: List[bytes]) -> np.ndarray:
+        packed = np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), -1)
+        bits = np.zeros((len(keys), len(self.widths), self.max_width), dtype=np.int64)
+        bits[:, self.bit_mask] = np.unpackbits(packed, axis=1, count=self.n_bits)
+        return (bits << np.arange(self.max_width)).sum(axis=-1).reshape(len(keys), -1, 2)
+
+    def decode(self, key: bytes) -> Structure:
+        return Structure(self.decode_many([key])[0])
+
+
+class VisitedStructures:
+    """
+    Set of structures stored by their packed key, so each visited structure costs a few bytes.
+    """
+
+    def __init__(self, encoder: StructureEncoder, structures: Iterable[Structure] = ()) -> None:
+        self.encoder = encoder
+        self.keys = set()
+        self.update(structures)
+
+    def add(self, structure: Structure) -> None:
+        self.keys.add(self.encoder.encode(structure))
+
+    def update(self, structures) -> None:
+        if isinstance(structures, VisitedStructures):
+            self.keys |= structures.keys
+            return
+
+        structures = list(structures)
+        if len(structures) > 0:
+            self.keys.update(self.encoder.encode_many(np.stack([structure.bins for structure in structures])))
+
+    def contains_many(self, bins: np.ndarray) -> np.ndarray:
+        if len(bins) == 0:
+            return np.zeros(0, dtype=bool)
+
+        return np.array([key in self.keys for key in self.encoder.encode_many(bins)], dtype=bool)
+
+    def __contains__(self, structure: Structure) -> bool:
+        return self.encoder.encode(structure) in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
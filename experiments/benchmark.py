@@ -0,0 +1,213 @@
+"""
+Throughput and sample efficiency benchmark of the explainer. Every configuration of the grid (dataset, model cost,
+num_bins, beam_size and sampler) explains the same instances with the same seeds, and the results are saved as JSON:
+
+    python experiments/benchmark.py --output results.json
+    python experiments/benchmark.py --output new.json --compare results.json
+
+With --compare, the exit status is 1 when a configuration regresses by more than --tolerance.
+
+Each instance is timed --repeats times without tracing and wall_time is the minimum of those runs (the median is also
+reported). Peak memory is measured in a separate run under tracemalloc, which slows the code it traces.
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.datasets import load_breast_cancer, load_iris, make_classification
+from sklearn.tree import DecisionTreeClassifier
+
+from esmace.ESExplainer import ESExplainer, Restriction
+from esmace.discretizer import TabularDiscretizer
+from esmace.expand_strategy import StepExpandStrategy
+from esmace.grouping_measure import SimpleMatchingGroupingMeasure
+from esmace.metric import FidelityMetric, SizeMetric
+from esmace.neighborhood import NoNeighborhood
+from esmace.sampler import CachingTabularSampler, TabularSampler
+
+DATASETS = {
+    'iris': lambda: load_iris(return_X_y=True),
+    'breast_cancer': lambda: load_breast_cancer(return_X_y=True),
+    'synthetic_50d': lambda: make_classification(n_samples=2_000, n_features=50, n_informative=10, random_state=0),
+}
+
+# Latency added to every call of the model, the slow model stands for a remote or deep model
+MODEL_LATENCY = {
+    'fast': 0.,
+    'slow': 0.002,
+}
+
+SAMPLERS = {
+    'tabular': lambda predict_fn, seed: TabularSampler(predict_fn, seed=seed),
+    'caching': lambda predict_fn, seed: CachingTabularSampler(predict_fn, n_points_cache=10_000, seed=seed),
+}
+
+GRID = {
+    'dataset': list(DATASETS),
+    'model': list(MODEL_LATENCY),
+    'num_bins': [5, 10],
+    'beam_size': [5, 10],
+    'sampler': list(SAMPLERS),
+}
+
+QUICK_GRID = {
+    'dataset': ['iris', 'breast_cancer'],
+    'model': ['fast'],
+    'num_bins': [10],
+    'beam_size': [5],
+    'sampler': list(SAMPLERS),
+}
+
+# Relative increase over the baseline reported as a regression, by metric. wall_time is the minimum of the timed runs
+COMPARED_METRICS = ('wall_time', 'model_calls', 'points_predicted', 'peak_memory')
+
+
+def make_predict_fn(clf, latency):
+    def predict_fn(X):
+        if latency > 0:
+            time.sleep(latency)
+        return np.ravel(clf.predict(X))
+
+    return predict_fn
+
+
+def explain_instance(config, X, y, clf, predict_fn, instance, seed, n_iterations):
+    sampler = SAMPLERS[config['sampler']](predict_fn, seed)
+    explainer = ESExplainer(sampler, TabularDiscretizer(num_bins=config['num_bins']),
+                            StepExpandStrategy(max_step=1), initial_sampling_size=100, verbose=False)
+    explainer.fit(X, y)
+
+    label = clf.predict(X[instance].reshape(1, -1))
+    fidelity = FidelityMetric(SimpleMatchingGroupingMeasure(label), p=0.01)
+    best, stats = explainer.explain(X[instance], SizeMetric(), NoNeighborhood(), Restriction(fidelity, 0.95),
+                                    beam_size=config['beam_size'], n_iterations=n_iterations, return_stats=True)
+    return sampler, best, stats
+
+
+def run_config(config, n_instances, n_iterations, repeats):
+    X, y = DATASETS[config['dataset']]()
+    clf = DecisionTreeClassifier(random_state=0, max_depth=4).fit(X, y)
+    predict_fn = make_predict_fn(clf, MODEL_LATENCY[config['model']])
+    instances = np.random.RandomState(0).choice(len(X), size=n_instances, replace=False)
+
+    runs = []
+    for seed, instance in enumerate(instances):
+        args = config, X, y, clf, predict_fn, instance, seed, n_iterations
+
+        # Same seed in every run, so the counters and the explanation are those of any of them
+        wall_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            sampler, best, stats = explain_instance(*args)
+            wall_times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        explain_instance(*args)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        runs.append({
+            'instance': int(instance),
+            'wall_time': float(np.min(wall_times)),
+            'wall_time_median': float(np.median(wall_times)),
+            # Includes the points predicted by fit, e.g. the cache of CachingTabularSampler
+            'model_calls': sampler.n_model_calls,
+            'points_predicted': sampler.n_points_predicted,
+            'peak_memory': peak_memory,
+            'utility': float(best[0].utility_score.score),
+            'restriction': float(best[0].restriction_score.score),
+            'search': stats.as_dict(),
+        })
+
+    summary = {metric: float(np.mean([run[metric] for run in runs]))
+               for metric in ('wall_time', 'wall_time_median', 'model_calls', 'points_predicted', 'peak_memory',
+                              'utility', 'restriction')}
+    return {'config': config, 'summary': summary, 'runs': runs}
+
+
+def config_key(config):
+    return tuple(config[axis] for axis in GRID)
+
+
+def compare(results, baseline, tolerance):
+    baseline = {config_key(result['config']): result['summary'] for result in baseline['results']}
+
+    n_regressions = 0
+    print(f'{"configuration":<45} ' + ' '.join(f'{metric:>17}' for metric in COMPARED_METRICS))
+    for result in results['results']:
+        key = config_key(result['config'])
+        if key not in baseline:
+            continue
+
+        changes = []
+        for metric in COMPARED_METRICS:
+            old, new = baseline[key][metric], result['summary'][metric]
+            change = new / old - 1 if old > 0 else 0.
+            regressed = change > tolerance
+            n_regressions += regressed
+            changes.append(f'{change:>+16.1%}' + ('!' if regressed else ' '))
+
+        print(f'{"/".join(map(str, key)):<45} ' + ' '.join(changes))
+
+    return n_regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--n-instances', type=int, default=3)
+    parser.add_argument('--n-iterations', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs of each instance')
+    parser.add_argument('--quick', action='store_true', help='run a reduced grid')
+    args = parser.parse_args()
+
+    grid = QUICK_GRID if args.quick else GRID
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'n_instances': args.n_instances,
+        'n_iterations': args.n_iterations,
+        'repeats': args.repeats,
+        'results': [],
+    }
+
+    for i, config in enumerate(configs):
+        result = run_config(config, args.n_instances, args.n_iterations, args.repeats)
+        results['results'].append(result)
+        summary = result['summary']
+        print(f'[{i + 1}/{len(configs)}] {"/".join(map(str, config_key(config)))}: '
+              f'{summary["wall_time"]:.2f}s (median {summary["wall_time_median"]:.2f}s), '
+              f'{summary["model_calls"]:.0f} calls, '
+              f'{summary["points_predicted"]:.0f} points, {summary["peak_memory"] / 2 ** 20:.1f} MiB', flush=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.tolerance) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Number of points each confidence bound needs on the breast cancer setup of test.py. Every bound explains the same
+instances with the same seeds; the savings are relative to hoeffding.
+"""
+import time
+
+import numpy as np
+from sklearn.datasets import load_breast_cancer
+from sklearn.tree import DecisionTreeClassifier
+
+from esmace.ESExplainer import ESExplainer, Restriction
+from esmace.discretizer import TabularDiscretizer
+from esmace.estimation_bounds import BOUNDS
+from esmace.expand_strategy import StepExpandStrategy
+from esmace.grouping_measure import SimpleMatchingGroupingMeasure
+from esmace.metric import FidelityMetric, SizeMetric
+from esmace.neighborhood import NoNeighborhood
+from esmace.sampler import TabularSampler
+
+X, y = load_breast_cancer(return_X_y=True)
+y %= 2
+
+clf = DecisionTreeClassifier(random_state=0, max_depth=4).fit(X, y)
+
+n_calls = 0
+n_points = 0
+
+
+def predict(x):
+    global n_calls, n_points
+    n_calls += 1
+    n_points += len(x)
+    return np.ravel(clf.predict(x))
+
+
+instances = [0, 50, 100, 200, 300]
+results = {}
+
+for bounds in BOUNDS:
+    n_calls = n_points = 0
+    start = time.time()
+    sizes = []
+
+    for seed, instance in enumerate(instances):
+        sampler = TabularSampler(predict, seed=seed)
+        explainer = ESExplainer(sampler, TabularDiscretizer(num_bins=10), StepExpandStrategy(max_step=1),
+                                initial_sampling_size=100, verbose=False)
+        explainer.fit(X, y)
+
+        label = clf.predict(X[instance].reshape(1, -1))
+        fidelity = FidelityMetric(SimpleMatchingGroupingMeasure(label), p=0.01, bounds=bounds)
+        exp = explainer.explain(X[instance], SizeMetric(), NoNeighborhood(), Restriction(fidelity, 0.95),
+                                beam_size=10, n_iterations=10)
+        sizes.append(exp[0].utility_score.score)
+
+    results[bounds] = n_calls, n_points, time.time() - start, np.mean(sizes)
+
+print(f'{"bounds":>20} {"model calls":>12} {"points":>10} {"saved":>7} {"time (s)":>9} {"mean size":>10}')
+for bounds, (calls, points, elapsed, size) in results.items():
+    saved = 1 - points / results['hoeffding'][1]
+    print(f'{bounds:>20} {calls:>12} {points:>10} {saved:>7.1%} {elapsed:>9.2f} {size:>10.2f}')
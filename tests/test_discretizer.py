@@ -0,0 +1,48 @@
+import numpy as np
+
+from esmace.discretizer import TabularDiscretizer
+from esmace.ESExplainer import ESExplainer
+from esmace.expand_strategy import StepExpandStrategy
+from esmace.sampler import TabularSampler
+
+
+def _data():
+    random_state = np.random.RandomState(0)
+    return np.column_stack((random_state.normal(size=100_000), random_state.exponential(size=100_000)))
+
+
+def test_fit_chunks_close_to_exact():
+    X = _data()
+    exact = TabularDiscretizer()
+    exact.fit(X, None)
+
+    sketched = TabularDiscretizer(seed=0).fit_chunks(X[start:start + 10_000] for start in range(0, len(X), 10_000))
+    np.testing.assert_array_equal(sketched.bin_start_[:, [0, -1]], exact.bin_start_[:, [0, -1]])
+
+    # Rank error of the inner bin starts
+    for feat in range(X.shape[1]):
+        ranks = np.mean(X[:, feat][:, None] <= sketched.bin_start_[feat, 1:-1], axis=0)
+        exact_ranks = np.mean(X[:, feat][:, None] <= exact.bin_start_[feat, 1:-1], axis=0)
+        assert np.max(np.abs(ranks - exact_ranks)) < 0.02
+
+
+def test_merge_shards():
+    X = _data()
+    shards = [TabularDiscretizer(seed=i).fit_chunks([X[i::4]]) for i in range(4)]
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+
+    assert merged.sketch_.n_ == len(X)
+    np.testing.assert_array_equal(merged.bin_start_[:, 0], X.min(axis=0))
+
+
+def test_explainer_keeps_discretizer_fitted_from_chunks():
+    X = _data()
+    discretizer = TabularDiscretizer(seed=0).fit_chunks([X[:50_000], X[50_000:]])
+    bin_start = discretizer.bin_start_.copy()
+
+    explainer = ESExplainer(TabularSampler(lambda X: np.zeros(len(X)), seed=0), discretizer, StepExpandStrategy(),
+                            verbose=False)
+    explainer.fit(X[:1_000], None)
+    np.testing.assert_array_equal(explainer.discretizer.bin_start_, bin_start)
@@ -0,0 +1,9 @@
+import numpy as np
+
+from esmace.estimation_bounds import kl_bounds, kl_sample_size, sample_size
+
+
+def test_kl_sample_size_matches_search():
+    for sample_mean in np.linspace(0, 1, 11):
+        for width in (0.2, 0.05, 0.01):
+            assert abs(kl_sample_size(sample_mean, width, 0.01) - sample_size(kl_bounds, sample_mean, width, 0.01)) <= 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from sklearn.datasets import load_breast_cancer
+from sklearn.tree import DecisionTreeClassifier
+
+from esmace.discretizer import TabularDiscretizer
+from esmace.ESExplainer import Budget, ESExplainer, Restriction
+from esmace.expand_strategy import StepExpandStrategy
+from esmace.grouping_measure import SimpleMatchingGroupingMeasure
+from esmace.metric import FidelityMetric, SizeMetric
+from esmace.neighborhood import NoNeighborhood
+from esmace.sampler import PrefetchingTabularSampler, TabularSampler
+
+
+@pytest.fixture(scope='module')
+def model():
+    X, y = load_breast_cancer(return_X_y=True)
+    return X, y, DecisionTreeClassifier(random_state=0, max_depth=4).fit(X, y)
+
+
+def _explainer(model):
+    X, y, clf = model
+    explainer = ESExplainer(TabularSampler(clf.predict, seed=0), TabularDiscretizer(), StepExpandStrategy(),
+                            verbose=False)
+    explainer.fit(X, y)
+    return explainer
+
+
+@pytest.mark.parametrize('budget', [Budget(max_points=2_000), Budget(max_points=50_000), Budget(max_model_calls=1),
+                                    Budget(max_model_calls=3)])
+@pytest.mark.parametrize('fidelity_utility', [False, True])
+def test_budget_never_exceeded(model, budget, fidelity_utility):
+    X, _, clf = model
+    explainer = _explainer(model)
+
+    for instance in (5, 10):
+        fidelity = FidelityMetric(SimpleMatchingGroupingMeasure(clf.predict(X[instance:instance + 1])), p=0.01)
+        if fidelity_utility:
+            params = fidelity, NoNeighborhood(), Restriction(SizeMetric(), 5)
+        else:
+            params = SizeMetric(), NoNeighborhood(), Restriction(fidelity, 0.95)
+
+        best, stats = explainer.explain(X[instance], *params, n_iterations=10, beam_size=5, return_stats=True,
+                                        budget=budget)
+
+        assert len(best) == 1
+        if budget.max_points is not None:
+            assert stats.points_predicted <= budget.max_points
+        if budget.max_model_calls is not None:
+            assert stats.model_calls <= budget.max_model_calls
+
+
+def test_save_skips_runtime_state(model, tmp_path):
+    X, y, clf = model
+    explainer = ESExplainer(PrefetchingTabularSampler(clf.predict, seed=0, batch_size=1_000), TabularDiscretizer(),
+                            StepExpandStrategy(), verbose=False)
+    explainer.fit(X, y)
+    fidelity = FidelityMetric(SimpleMatchingGroupingMeasure(clf.predict(X[:1])), p=0.01)
+    explainer.explain(X[0], SizeMetric(), NoNeighborhood(), Restriction(fidelity, 0.95), n_iterations=2)
+
+    explainer.save(tmp_path)
+    explainer.sampler.close()
+    assert not any('_buffer' in path.name for path in tmp_path.iterdir())
+
+    loaded = ESExplainer.load(tmp_path, clf.predict)
+    assert not hasattr(loaded, 'hall_of_fame_') and not hasattr(loaded, 'stats_')
+    np.testing.assert_array_equal(loaded.discretizer.bin_start_, explainer.discretizer.bin_start_)
+    best = loaded.explain(X[0], SizeMetric(), NoNeighborhood(), Restriction(fidelity, 0.95), n_iterations=2)
+    loaded.sampler.close()
+    assert len(best) == 1
@@ -0,0 +1,39 @@
+import numpy as np
+
+from esmace.candidate import Explanation
+from esmace.grouping_measure import SimpleMatchingGroupingMeasure
+from esmace.mab import mab_lub
+from esmace.metric import FidelityMetric
+from esmace.structure import Structure
+
+
+def test_mab_lub_ties_do_not_pull_single_points():
+    metric = FidelityMetric(SimpleMatchingGroupingMeasure(1), p=0.01, bounds='wilson')
+    # Pairs of arms with the same mean, whose estimates are exact: once their bounds are narrow enough, more points
+    # cannot tell them apart
+    means = np.repeat([0.9, 0.92, 0.94, 0.96, 0.98], 2)
+    candidates = [Explanation(Structure(np.array([[i, i]])), None, None) for i in range(len(means))]
+
+    def labels(mean, n_points):
+        y = np.zeros(n_points, dtype=int)
+        y[:int(round(mean * n_points))] = 1
+        return y
+
+    for candidate, mean in zip(candidates, means):
+        candidate.utility_score = metric.calculate(None, labels(mean, 100), candidate.structure)
+
+    pulls = []
+
+    def update_metrics(arms, n_points):
+        pulls.append(list(n_points))
+        for arm, n in zip(arms, n_points):
+            mean = means[arm.structure.bins[0, 0]]
+            arm.utility_score = metric.calculate(None, labels(mean, n), arm.structure, arm.utility_score)
+        return n_points
+
+    selected = mab_lub(candidates, 4, 0.01, lambda x: x.utility_score, update_metrics,
+                       metric.reduce_uncertainty_to, round_size=4)
+
+    assert sorted(means[[candidate.structure.bins[0, 0] for candidate in selected[:4]]]) == [0.96, 0.96, 0.98, 0.98]
+    assert all(n > 0 for n_points in pulls for n in n_points)
+    assert len(pulls) < 50
@@ -0,0 +1,19 @@
+import numpy as np
+
+from esmace.grouping_measure import SimpleMatchingGroupingMeasure
+from esmace.metric import FidelityMetric
+from esmace.structure import Structure
+
+
+def test_reduce_uncertainty_to_zero_once_narrow_enough():
+    structure = Structure(np.array([[0, 0]]))
+    for bounds in ('hoeffding', 'wilson', 'variance_wilson'):
+        metric = FidelityMetric(SimpleMatchingGroupingMeasure(1), p=0.01, bounds=bounds)
+        score = metric.calculate(None, np.ones(100, dtype=int), structure)
+
+        n_points = metric.reduce_uncertainty_to(score, 0.05)
+        assert n_points > 0
+
+        score = metric.calculate(None, np.ones(n_points, dtype=int), structure, score)
+        assert max(score.score - score.lb, score.ub - score.score) < 0.05
+        assert metric.reduce_uncertainty_to(score, 0.05) == 0
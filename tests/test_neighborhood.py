@@ -0,0 +1,30 @@
+import numpy as np
+from sklearn.datasets import load_breast_cancer
+
+from esmace.discretizer import TabularDiscretizer
+from esmace.neighborhood import DataSupportNeighborhood
+
+
+def test_support_matches_brute_force():
+    X, y = load_breast_cancer(return_X_y=True)
+    discretizer = TabularDiscretizer(num_bins=10)
+    discretizer.fit(X, y)
+    neighborhood = DataSupportNeighborhood()
+    neighborhood.fit(X, discretizer)
+
+    random_state = np.random.RandomState(0)
+    low = random_state.randint(0, 10, size=(50, X.shape[1]))
+    high = np.minimum(low + random_state.randint(0, 10, size=low.shape), 9)
+    bins = np.stack((low, high), axis=-1)
+    # Every feature covering every bin, the support is the whole dataset
+    bins[0] = discretizer.discretizer_area().bins
+
+    obs_bins = discretizer.to_obs_bins_many(X)
+    expected = [np.sum(np.all((obs_bins >= structure_bins[:, 0]) & (obs_bins <= structure_bins[:, 1]), axis=1))
+                for structure_bins in bins]
+
+    support = neighborhood.support_many(bins)
+    np.testing.assert_array_equal(support, expected)
+    assert support[0] == len(X)
+    # Alone, every feature is skipped
+    assert neighborhood.support_many(bins[:1])[0] == len(X)
@@ -0,0 +1,106 @@
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+from esmace.discretizer import TabularDiscretizer
+from esmace.sampler import CachingTabularSampler, PredictionCache, TabularSampler
+from esmace.structure import Structure
+
+
+def _fitted_sampler(X, y, **kwargs):
+    clf = DecisionTreeClassifier(random_state=0, max_depth=3).fit(X, y)
+    discretizer = TabularDiscretizer(num_bins=10)
+    discretizer.fit(X, y)
+
+    sampler = TabularSampler(clf.predict, seed=0, **kwargs)
+    sampler.dataset_fit(X)
+    sampler.fit_discretizer(discretizer)
+    return sampler, discretizer
+
+
+def _discrete_data():
+    random_state = np.random.RandomState(0)
+    X = random_state.randint(0, 3, size=(200, 4)).astype(float)
+    y = (X[:, 0] + X[:, 1] > 2).astype(int)
+    return X, y
+
+
+def test_sample_many_zero_points():
+    X, y = _discrete_data()
+    sampler, discretizer = _fitted_sampler(X, y)
+    structure = discretizer.to_structure(X[0])
+
+    assert sampler.sample_many([], []) == []
+
+    (X_sample, y_sample), = sampler.sample_many([structure], [0])
+    assert X_sample.shape == (0, X.shape[1])
+    assert len(y_sample) == 0
+    assert sampler.n_model_calls == 0
+
+
+def test_initial_sampling_fully_cached():
+    X, y = _discrete_data()
+    sampler, discretizer = _fitted_sampler(X, y, prediction_cache=PredictionCache(), chunk_size=64)
+    structures = discretizer.to_structures(X[:5])
+
+    first = sampler.initial_sampling_many(structures, 100)
+    n_model_calls = sampler.n_model_calls
+
+    second = sampler.initial_sampling_many(structures, 100)
+    assert sampler.n_model_calls == n_model_calls
+    for (X_first, y_first), (X_second, y_second) in zip(first, second):
+        np.testing.assert_array_equal(X_first, X_second)
+        np.testing.assert_array_equal(y_first, y_second)
+
+
+def test_reused_parent_points_are_uniform():
+    random_state = np.random.RandomState(0)
+    X = random_state.uniform(size=(2_000, 2))
+    y = (X[:, 0] > 0.5).astype(int)
+    sampler, discretizer = _fitted_sampler(X, y)
+    bin_start = discretizer.bin_start_[0]
+
+    # Grow the first feature one bin at a time from bin 5 to [2, 7], reusing the points of each parent
+    low, high = 5, 5
+    structure = Structure(np.array([[low, high], [0, 9]]))
+    sample = sampler.initial_sampling_many([structure], 2_000)[0]
+    for low, high in ((4, 5), (4, 6), (3, 6), (2, 6), (2, 7)):
+        parent, structure = structure, Structure(np.array([[low, high], [0, 9]]))
+        sample = sampler.initial_sampling_many([structure], 2_000, parents=[parent], parents_samples=[sample])[0]
+
+    edges = bin_start[2:9]
+    shares = np.histogram(sample[0][:, 0], bins=edges)[0] / len(sample[0])
+    np.testing.assert_allclose(shares, np.diff(edges) / (edges[-1] - edges[0]), atol=0.04)
+
+
+def test_caching_sampler_refit_on_new_ranges():
+    random_state = np.random.RandomState(0)
+    X = random_state.uniform(size=(500, 3))
+    y = (X[:, 0] > 0.5).astype(int)
+    clf = DecisionTreeClassifier(random_state=0, max_depth=3).fit(X, y)
+
+    sampler = CachingTabularSampler(clf.predict, n_points_cache=1_000, seed=0)
+    discretizer = TabularDiscretizer(num_bins=5)
+    for X_fit in (X, X * 10 + 1000):
+        discretizer.fit(X_fit, y)
+        sampler.dataset_fit(X_fit)
+        sampler.fit_discretizer(discretizer)
+
+        assert np.all(sampler.X_cache_ >= X_fit.min(axis=0)) and np.all(sampler.X_cache_ <= X_fit.max(axis=0))
+
+
+def test_prediction_cache_cleared_on_refit():
+    random_state = np.random.RandomState(0)
+    X = random_state.uniform(size=(500, 3))
+    y = (X[:, 0] > 0.5).astype(int)
+    sampler, discretizer = _fitted_sampler(X, y, prediction_cache=PredictionCache())
+    sampler.initial_sampling_many(discretizer.to_structures(X[:5]), 100)
+
+    X_new = X * 10 + 1000
+    discretizer.fit(X_new, y)
+    sampler.fit_discretizer(discretizer)
+
+    structure = discretizer.to_structure(X_new[0])
+    X_sample, _ = sampler.initial_sampling_many([structure], 100)[0]
+    features = np.arange(X.shape[1])
+    assert np.all(X_sample >= discretizer.bin_start_[features, structure.bins[:, 0]])
+    assert np.all(X_sample <= discretizer.bin_start_[features, structure.bins[:, 1] + 1])
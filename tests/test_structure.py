@@ -0,0 +1,23 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+
+from esmace.structure import Structure
+
+
+def test_pickled_structure_equal_across_processes():
+    structure = Structure(np.array([[0, 2], [3, 3]]))
+
+    # Pickled by another process, with another salt for the hash of bytes
+    code = 'import pickle, sys, numpy as np; from esmace.structure import Structure; ' \
+           'sys.stdout.buffer.write(pickle.dumps(Structure(np.array([[0, 2], [3, 3]]))))'
+    env = dict(os.environ, PYTHONHASHSEED='1', PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    loaded = pickle.loads(subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                         check=True).stdout)
+
+    assert loaded == structure
+    assert hash(loaded) == hash(structure)
+    assert loaded in {structure}